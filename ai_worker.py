@@ -4,22 +4,41 @@ import time
 import requests
 import os
 import datetime
+import archiver
+import profiler
+import replay
 
 # --- CONFIGURAÇÃO ---
 
 # Tenta ler do ambiente K8s
 REDIS_HOST = os.environ.get('REDIS_HOST', 'redis-service') 
+REDIS_PORT = int(os.environ.get('REDIS_PORT', 6379))
 CANAL_EVENTOS = 'leiloes_finalizados'
 
+# Pool compartilhado pelo loop, pela busca de detalhes e pelas notificações
+r = redis.StrictRedis(connection_pool=redis.ConnectionPool(host=REDIS_HOST, port=REDIS_PORT, decode_responses=True))
+
+# Limites das filas 'user_notif:ID' (usuários inativos não acumulam para sempre)
+NOTIF_MAX = int(os.environ.get('NOTIF_MAX', 50))
+NOTIF_TTL_SECONDS = int(os.environ.get('NOTIF_TTL_SECONDS', 7 * 24 * 3600))
+
 # Este é o URL do Webhook do Discord que você configurou
 DISCORD_WEBHOOK_URL = os.environ.get('DISCORD_WEBHOOK_URL', 'https://discord.com/api/webhooks/YOUR_WEBHOOK_ID/YOUR_WEBHOOK_TOKEN')
 
+# Último canal_seq processado (também salvo no Redis para sobreviver a restarts)
+CURSOR_KEY = 'replay:cursor:ai_worker'
+ultimo_canal_seq = None
+
 # --- FUNÇÕES AUXILIARES ---
 
+def configure_redis(client):
+    """Troca o cliente Redis usado pelo worker (o harness injeta o próprio pool)."""
+    global r
+    r = client
+
 def get_auction_details(auction_id):
     """Busca detalhes de um leilão FECHADO (closed:ID)."""
     try:
-        r = redis.StrictRedis(host=REDIS_HOST, decode_responses=True)
         # O resultado final é armazenado na chave 'closed:ID'
         details = r.hgetall(f'closed:{auction_id}')
         if details:
@@ -87,11 +106,15 @@ def send_discord_notification(details):
         print(f"✅ Notificação do Leilão {auction_id} enviada ao Discord!", flush=True)
 
         # 4. Envia notificação para o cliente web (usando RPUSH no Redis)
-        r_notif = redis.StrictRedis(host=REDIS_HOST, decode_responses=True)
         vencedor_id = details.get('vencedor_id')
         
         if status == 'ENCERRADO' and vencedor_id and vencedor_id != 'N/A':
-            r_notif.rpush(f'user_notif:{vencedor_id}', f"🏆 PARABÉNS! Você VENCEU o leilão '{titulo}' por R$ {valor_final}!")
+            chave = f'user_notif:{vencedor_id}'
+            pipe = r.pipeline()
+            pipe.rpush(chave, f"🏆 PARABÉNS! Você VENCEU o leilão '{titulo}' por R$ {valor_final}!")
+            pipe.ltrim(chave, -NOTIF_MAX, -1)
+            pipe.expire(chave, NOTIF_TTL_SECONDS)
+            pipe.execute()
         
     except requests.exceptions.HTTPError as e:
         print(f"ERRO ao enviar notificação para o Discord: {e}", flush=True)
@@ -100,17 +123,90 @@ def send_discord_notification(details):
         print(f"ERRO inesperado na notificação do Discord: {e}", flush=True)
 
 
+def handle_event(data):
+    """Processa um evento de leilão finalizado recebido do canal."""
+    auction_id = data.get('auction_id')
+    status = data.get('status')
+    
+    print("\n--- NOVO EVENTO RECEBIDO ---", flush=True)
+    print(f"Leilão ID: {auction_id}, Status: {status}", flush=True)
+    
+    with profiler.track(f"evento {status} {auction_id}"):
+        # 1. Busca os detalhes finais do leilão (da chave closed:ID)
+        details = get_auction_details(auction_id)
+        
+        if details:
+            print(f"Detalhes do Leilão {auction_id} recuperados.", flush=True)
+            
+            # 2. Envia a notificação
+            send_discord_notification(details)
+        else:
+            print(f"AVISO: Não foi possível encontrar os detalhes do leilão fechado ID: {auction_id}", flush=True)
+
+
+def _marcar_processado(canal_seq):
+    global ultimo_canal_seq
+    ultimo_canal_seq = canal_seq
+    r.set(CURSOR_KEY, canal_seq)
+
+def recuperar_eventos():
+    """Reprocessa os fechamentos publicados enquanto o worker estava desconectado."""
+    global ultimo_canal_seq
+    if ultimo_canal_seq is None:
+        cursor = r.get(CURSOR_KEY)
+        if cursor is None:
+            # Primeira execução: começa do ponto atual, sem reprocessar o histórico
+            _marcar_processado(replay.channel_seq(r))
+            return
+        ultimo_canal_seq = int(cursor)
+
+    seq_atual, resync, eventos = replay.channel_events_since(r, ultimo_canal_seq)
+    if resync:
+        print(f"AVISO: eventos após canal_seq {ultimo_canal_seq} já saíram do log de replay. Seguindo de {seq_atual}.", flush=True)
+        _marcar_processado(seq_atual)
+        return
+
+    if eventos:
+        print(f"🔁 Recuperando {len(eventos)} eventos perdidos durante a desconexão.", flush=True)
+    for data in eventos:
+        handle_event(data)
+        _marcar_processado(data['canal_seq'])
+
+def processar_evento(data):
+    """Processa um evento do canal na ordem de canal_seq, sem duplicar nem pular."""
+    canal_seq = data.get('canal_seq')
+    if canal_seq is None or ultimo_canal_seq is None:
+        handle_event(data)
+        if canal_seq is not None:
+            _marcar_processado(canal_seq)
+        return
+
+    if canal_seq <= ultimo_canal_seq:
+        return  # Já processado (sobreposição com o replay)
+    if canal_seq > ultimo_canal_seq + 1:
+        # Buraco na sequência: o replay entrega os que faltaram e também este
+        recuperar_eventos()
+        return
+
+    handle_event(data)
+    _marcar_processado(canal_seq)
+
+
 def listen_for_events():
     """Loop principal que escuta eventos do Redis Pub/Sub."""
     
-    # Usa conexão local para cada tentativa (garante estado limpo)
+    # Nova assinatura a cada tentativa (garante estado limpo); o pool reconecta sozinho
     try:
-        global r, p
-        r = redis.StrictRedis(host=REDIS_HOST, decode_responses=True)
         p = r.pubsub()
         p.subscribe(CANAL_EVENTOS)
         
         print(f"Agente de IA iniciado. Escutando canal: '{CANAL_EVENTOS}' no Redis em {REDIS_HOST}...", flush=True)
+        
+        # Indexa fechamentos antigos para que o arquivador os encontre
+        archiver.backfill_closed_index(r)
+        
+        # Já inscrito: recupera o que foi publicado durante a desconexão
+        recuperar_eventos()
     except Exception as e:
         print(f"ERRO DE CONEXÃO INICIAL COM O REDIS: {e}", flush=True)
         # Tenta reconectar a cada 5 segundos
@@ -118,35 +214,39 @@ def listen_for_events():
         listen_for_events()
         return
 
+    proximo_arquivamento = 0
+
     while True:
         try:
+            # Move leilões fechados antigos para o armazenamento frio.
+            # Falha no arquivo (disco cheio, volume sem escrita) não pode parar as notificações:
+            # registra e tenta de novo só no próximo intervalo.
+            if time.time() >= proximo_arquivamento:
+                proximo_arquivamento = time.time() + archiver.ARCHIVE_INTERVAL_SECONDS
+                try:
+                    archiver.archive_closed_auctions(r)
+                except Exception as e:
+                    print(f"ERRO no arquivamento (próxima tentativa em {archiver.ARCHIVE_INTERVAL_SECONDS}s): {e}", flush=True)
+
             message = p.get_message()
             if message and message['type'] == 'message':
-                data = json.loads(message['data'])
-                auction_id = data.get('auction_id')
-                status = data.get('status')
-                
-                print("\n--- NOVO EVENTO RECEBIDO ---", flush=True)
-                print(f"Leilão ID: {auction_id}, Status: {status}", flush=True)
-                
-                # 1. Busca os detalhes finais do leilão (da chave closed:ID)
-                details = get_auction_details(auction_id)
-                
-                if details:
-                    print(f"Detalhes do Leilão {auction_id} recuperados.", flush=True)
-                    
-                    # 2. Envia a notificação
-                    send_discord_notification(details)
-                else:
-                    print(f"AVISO: Não foi possível encontrar os detalhes do leilão fechado ID: {auction_id}", flush=True)
+                processar_evento(json.loads(message['data']))
 
             time.sleep(0.1) 
         except Exception as e:
             print(f"ERRO no loop do Worker: {e}. Tentando reconectar...", flush=True)
+            # Libera a conexão da assinatura antiga antes de criar a nova
+            try:
+                p.close()
+            except Exception:
+                pass
             time.sleep(5)
             # Ao invés de tentar lidar com o erro aqui, reinicia a função de escuta
             listen_for_events()
             break
 
 if __name__ == '__main__':
+    if profiler.PROFILE_ENABLED:
+        profiler.start()
+    profiler.watch(r)
     listen_for_events()
\ No newline at end of file
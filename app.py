@@ -4,21 +4,57 @@ import redis
 import datetime
 import json
 import time
+import heapq
+import itertools
+import threading
 import os
-from seed import check_and_seed # <-- AGORA ATIVA E IMPORTANDO
+import archiver
+import search_index
+import user_index
+import ranking
+import replay
+import profiler
 
 # --- CONFIGURAÇÃO ---
 app = Flask(__name__)
-CORS(app)
+CORS(app, expose_headers=['Retry-After', 'X-Total-Count'])
+profiler.init_app(app)
 
 # Tenta ler do ambiente K8s, fallback para redis-service
 REDIS_HOST = os.environ.get('REDIS_HOST', 'redis-service') 
-r = redis.StrictRedis(host=REDIS_HOST, decode_responses=True)
+REDIS_PORT = int(os.environ.get('REDIS_PORT', 6379))
+# Conexões por processo (cada worker do gunicorn cria o seu pool após o fork)
+REDIS_MAX_CONNECTIONS = int(os.environ.get('REDIS_MAX_CONNECTIONS', 64))
+
+def new_redis_client():
+    """Cliente Redis com um pool próprio."""
+    return redis.StrictRedis(connection_pool=redis.ConnectionPool(
+        host=REDIS_HOST, port=REDIS_PORT, decode_responses=True, max_connections=REDIS_MAX_CONNECTIONS
+    ))
+
+r = new_redis_client()
 
 CANAL_EVENTOS = 'leiloes_finalizados' 
 
+# Long-poll de notificações: máximo entregue por chamada e espera máxima (s)
+NOTIF_MAX = int(os.environ.get('NOTIF_MAX', 50))
+NOTIF_MAX_ESPERA = int(os.environ.get('NOTIF_MAX_ESPERA', 30))
+
+# Cada long-poll ocupa uma thread do worker gthread durante toda a espera.
+# Limita quantos podem esperar ao mesmo tempo por processo (padrão: metade das
+# threads), para que lances, status e /healthz/ready sempre tenham thread livre.
+# Acima do limite a requisição responde na hora (espera=0) com Retry-After.
+NOTIF_MAX_LONGPOLL = int(os.environ.get('NOTIF_MAX_LONGPOLL', max(1, int(os.environ.get('GUNICORN_THREADS', 8)) // 2)))
+NOTIF_RETRY_SEGUNDOS = int(os.environ.get('NOTIF_RETRY_SEGUNDOS', 5))
+_vagas_longpoll = threading.BoundedSemaphore(NOTIF_MAX_LONGPOLL)
+
 # --- FUNÇÕES AUXILIARES ---
 
+def configure_redis(client):
+    """Troca o cliente Redis usado pela API (o harness injeta o próprio pool)."""
+    global r
+    r = client
+
 def get_next_id(key):
     """Incrementa um contador no Redis e retorna o novo ID."""
     return r.incr(f'next_{key}_id')
@@ -34,6 +70,25 @@ def get_user_data(user_id):
         "id": data.get('id', str(user_id))
     }
 
+def parse_paginacao(args):
+    """Lê ?pagina= e ?por_pagina= (1 a 100). Lança ValueError se inválidos."""
+    pagina = int(args.get('pagina', 1))
+    por_pagina = int(args.get('por_pagina', 20))
+    if pagina < 1 or not 1 <= por_pagina <= 100:
+        raise ValueError("Paginação inválida.")
+    return pagina, por_pagina
+
+def format_tempo_restante(horario_termino, agora):
+    """Formata o tempo restante até o término de um leilão ("Xm Ys")."""
+    termino = datetime.datetime.strptime(horario_termino, '%Y-%m-%d %H:%M:%S')
+    tempo_restante = termino - agora
+    
+    if tempo_restante.total_seconds() > 0:
+        minutos = int(tempo_restante.total_seconds() // 60)
+        segundos = int(tempo_restante.total_seconds() % 60)
+        return f"{minutos}m {segundos}s"
+    return "0m 0s (EXPIRADO - AGUARDANDO FECHAMENTO)"
+
 def check_and_close_auction(auction_id):
     """
     Verifica o tempo de um leilão. Se encerrado, move-o para o histórico
@@ -43,12 +98,20 @@ def check_and_close_auction(auction_id):
     leilao = r.hgetall(f'auction:{auction_id}')
     
     if not leilao or leilao.get('ativo') == 'False':
-        r.srem('active_auctions', auction_id)
+        pipe = r.pipeline()
+        pipe.srem('active_auctions', auction_id)
+        search_index.unindex_auction(pipe, auction_id, leilao.get('titulo'))
+        ranking.remove_auction(pipe, auction_id)
+        pipe.execute()
         return False, "Leilão não ativo/inexistente."
     
     if 'horario_termino' not in leilao:
         print(f"ERRO: Leilão {auction_id} sem horário de término.", flush=True)
-        r.srem('active_auctions', auction_id) 
+        pipe = r.pipeline()
+        pipe.srem('active_auctions', auction_id)
+        search_index.unindex_auction(pipe, auction_id, leilao.get('titulo'))
+        ranking.remove_auction(pipe, auction_id)
+        pipe.execute()
         return True, "Dados incompletos e removido."
     
     # 1. Checa o horário
@@ -56,8 +119,12 @@ def check_and_close_auction(auction_id):
     
     if datetime.datetime.now() > termino:
         # 2. Fecha o leilão no Redis
-        r.hset(f'auction:{auction_id}', 'ativo', 'False')
-        r.srem('active_auctions', auction_id)
+        pipe = r.pipeline()
+        pipe.hset(f'auction:{auction_id}', 'ativo', 'False')
+        pipe.srem('active_auctions', auction_id)
+        search_index.unindex_auction(pipe, auction_id, leilao.get('titulo'))
+        ranking.remove_auction(pipe, auction_id)
+        pipe.execute()
         
         try:
             lance_atual = float(leilao.get('lance_atual', 0))
@@ -90,16 +157,18 @@ def check_and_close_auction(auction_id):
         resultado_str = {k: str(v) for k, v in resultado.items()}
         
         try:
+            fechado_em = time.time()
+            pipe = r.pipeline()
             # Persiste os resultados finais (Chave closed:ID)
-            r.hset(f'closed:{auction_id}', mapping=resultado_str)
+            pipe.hset(f'closed:{auction_id}', mapping=resultado_str)
+            # Indexa o fechamento para o arquivador (score = horário de fechamento)
+            pipe.zadd(archiver.CLOSED_INDEX, {auction_id: fechado_em})
+            if resultado["vencedor_id"] != 'N/A':
+                user_index.add_win(pipe, resultado["vencedor_id"], auction_id, fechado_em)
+            pipe.execute()
             
-      
-            r_pub = redis.StrictRedis(host=REDIS_HOST, decode_responses=True)
-
-            r_pub.publish(CANAL_EVENTOS, json.dumps({
-                "auction_id": auction_id,
-                "status": resultado["status"]
-            }))
+            # Publica com número de sequência e guarda no log de replay
+            replay.publish_close(r, auction_id, resultado["status"])
             
             # LOG VISÍVEL DE SUCESSO
             print("="*60, flush=True)
@@ -117,6 +186,20 @@ def check_and_close_auction(auction_id):
 
 
 
+@app.route('/healthz/live', methods=['GET'])
+def liveness():
+    """Liveness: o processo responde (não depende do Redis)."""
+    return jsonify({"status": "ok"}), 200
+
+@app.route('/healthz/ready', methods=['GET'])
+def readiness():
+    """Readiness: só recebe tráfego quando o Redis responde."""
+    try:
+        r.ping()
+    except redis.exceptions.RedisError as e:
+        return jsonify({"status": "indisponivel", "erro": str(e)}), 503
+    return jsonify({"status": "ok"}), 200
+
 @app.route('/register', methods=['POST'])
 def register():
     """Registra um novo usuário no Redis."""
@@ -163,8 +246,13 @@ def create_auction():
         "ativo": "True"
     }
 
-    r.hset(f'auction:{auction_id}', mapping={k: str(v) for k, v in leilao_data.items()})
-    r.sadd('active_auctions', auction_id)
+    pipe = r.pipeline()
+    pipe.hset(f'auction:{auction_id}', mapping={k: str(v) for k, v in leilao_data.items()})
+    pipe.sadd('active_auctions', auction_id)
+    search_index.index_auction(pipe, auction_id, titulo, preco_inicial, leilao_data['horario_termino'])
+    user_index.add_owned(pipe, user_id, auction_id)
+    ranking.add_auction(pipe, auction_id)
+    pipe.execute()
     
     return jsonify({"auction_id": auction_id, "status": "Criado"}), 201
 
@@ -214,17 +302,40 @@ def place_bid():
     # score=valor para ordenação; member=JSON string do lance
     pipe.zadd(f'bids:{auction_id}', {json.dumps(bid_data): valor}) 
     
+    # Mantém o índice de preço da busca, o índice do usuário e os rankings em dia
+    search_index.update_price(pipe, auction_id, valor)
+    user_index.add_bid(pipe, user_id, auction_id)
+    ranking.record_bid(pipe, auction_id)
+    
     pipe.execute()
     
-    # Publica evento do novo lance
-    r.publish(f'bid_updates:{auction_id}', json.dumps(bid_data))
+    # Publica evento do novo lance (com a sequência do leilão, para replay)
+    seq = replay.publish_bid(r, auction_id, bid_data)
+
+    return jsonify({"mensagem": "Lance registrado.", "novo_lance": valor, "seq": seq}), 200
+
+@app.route('/auction/<int:auction_id>/events', methods=['GET'])
+def get_auction_events(auction_id):
+    """
+    Eventos (lances e fechamento) com seq > ?desde=N, para quem reconectou.
+    Se o log já foi cortado além desse ponto, responde resync=true e o
+    cliente recarrega o estado completo.
+    """
+    try:
+        desde = int(request.args.get('desde', 0))
+    except ValueError:
+        return jsonify({"erro": "Parâmetro 'desde' inválido."}), 400
 
-    return jsonify({"mensagem": "Lance registrado.", "novo_lance": valor}), 200
+    seq_atual, resync, eventos = replay.events_since(r, auction_id, desde)
+    return jsonify({"seq_atual": seq_atual, "resync": resync, "eventos": eventos}), 200
 
 @app.route('/auction/<int:auction_id>/bids', methods=['GET'])
 def get_auction_bids(auction_id):
     """Retorna todos os lances de um leilão, ordenados pelo valor (decrescente)."""
     bids = r.zrevrange(f'bids:{auction_id}', 0, -1)
+    if not bids and not r.exists(f'auction:{auction_id}'):
+        # Leilão já saiu do Redis: busca no armazenamento frio
+        return jsonify(archiver.get_archived_bids(auction_id) or []), 200
     bid_list = [json.loads(bid) for bid in bids]
     return jsonify(bid_list), 200
 
@@ -249,15 +360,7 @@ def get_all_status():
             continue
             
         try:
-            termino = datetime.datetime.strptime(leilao['horario_termino'], '%Y-%m-%d %H:%M:%S')
-            tempo_restante = termino - agora
-            
-            if tempo_restante.total_seconds() > 0:
-                minutos = int(tempo_restante.total_seconds() // 60)
-                segundos = int(tempo_restante.total_seconds() % 60)
-                tempo_str = f"{minutos}m {segundos}s"
-            else:
-                tempo_str = "0m 0s (EXPIRADO - AGUARDANDO FECHAMENTO)"
+            tempo_str = format_tempo_restante(leilao['horario_termino'], agora)
 
             usuario_atual_id = leilao.get('usuario_atual_id')
             usuario_atual = get_user_data(usuario_atual_id).get('nome', 'Nenhum')
@@ -278,42 +381,249 @@ def get_all_status():
 
     return jsonify(status_list), 200
 
+@app.route('/auction/search', methods=['GET'])
+def search_auctions():
+    """
+    Busca leilões ativos pelo título (sem acento) e faixa de preço, usando os
+    índices do Redis em vez de montar o status completo.
+    """
+    args = request.args
+    ordenar = args.get('ordenar', 'termino')
+    ordem = args.get('ordem', 'asc')
+    
+    try:
+        preco_min = float(args['preco_min']) if args.get('preco_min') else None
+        preco_max = float(args['preco_max']) if args.get('preco_max') else None
+        pagina, por_pagina = parse_paginacao(args)
+    except ValueError:
+        return jsonify({"erro": "Parâmetros numéricos inválidos."}), 400
+    
+    if ordenar not in ('preco', 'termino') or ordem not in ('asc', 'desc'):
+        return jsonify({"erro": "Parâmetros de busca inválidos."}), 400
+
+    total, ids = search_index.search(
+        r, args.get('q', ''), preco_min, preco_max, ordenar,
+        decrescente=(ordem == 'desc'), offset=(pagina - 1) * por_pagina, limit=por_pagina
+    )
+    
+    pipe = r.pipeline(transaction=False)
+    for auction_id in ids:
+        pipe.hgetall(f'auction:{auction_id}')
+    
+    agora = datetime.datetime.now()
+    resultados = []
+    for leilao in pipe.execute():
+        # Índices podem ficar um instante atrás de um fechamento
+        if not leilao or leilao.get('ativo') == 'False':
+            continue
+        resultados.append({
+            "id": int(leilao['id']),
+            "titulo": leilao['titulo'],
+            "proprietario_id": leilao['proprietario_id'],
+            "preco_inicial": float(leilao['preco_inicial']),
+            "lance_atual": float(leilao['lance_atual']),
+            "usuario_atual_id": leilao.get('usuario_atual_id'),
+            "horario_termino": leilao['horario_termino'],
+            "tempo_restante": format_tempo_restante(leilao['horario_termino'], agora)
+        })
+
+    return jsonify({
+        "total": total,
+        "pagina": pagina,
+        "por_pagina": por_pagina,
+        "resultados": resultados
+    }), 200
+
+@app.route('/auction/ranking', methods=['GET'])
+def get_ranking():
+    """
+    Top-K de leilões ativos: ?tipo=velocidade (lances/min recentes), lances
+    (total) ou encerrando (menos tempo restante). Lê só os K primeiros de
+    Sorted Sets mantidos a cada lance, sem varrer os leilões.
+    """
+    tipo = request.args.get('tipo', 'velocidade')
+    try:
+        k = int(request.args.get('k', 10))
+    except ValueError:
+        return jsonify({"erro": "Parâmetro 'k' inválido."}), 400
+    
+    if tipo not in ranking.TIPOS or not 1 <= k <= 50:
+        return jsonify({"erro": "Parâmetros de ranking inválidos."}), 400
+
+    topo = ranking.top(r, tipo, k)
+    
+    pipe = r.pipeline(transaction=False)
+    for auction_id, _ in topo:
+        pipe.hmget(f'auction:{auction_id}', 'titulo', 'lance_atual', 'horario_termino', 'ativo')
+    
+    agora = datetime.datetime.now()
+    resultados = []
+    for (auction_id, score), (titulo, lance_atual, horario_termino, ativo) in zip(topo, pipe.execute()):
+        if ativo != 'True':
+            continue
+        resultados.append({
+            "id": int(auction_id),
+            "titulo": titulo,
+            "lance_atual": float(lance_atual),
+            "horario_termino": horario_termino,
+            "tempo_restante": format_tempo_restante(horario_termino, agora),
+            "score": round(score, 2)
+        })
+
+    return jsonify({"tipo": tipo, "resultados": resultados}), 200
+
+def _history_entry(auction_id, data):
+    """Formata um leilão encerrado (quente ou arquivado) para o histórico."""
+    vencedor_nome = data.get('vencedor_nome', 'N/A')
+    return {
+        "id": int(auction_id),
+        "item": data.get('titulo', 'N/A'),
+        "descricao": f"Vencedor: {vencedor_nome}, Valor: R$ {data.get('valor_final', '0.0')}",
+        "status_final": data.get('status', 'N/A')
+    }
+
 @app.route('/auction/history', methods=['GET'])
 def get_history():
-    """Retorna o histórico de leilões encerrados."""
-    closed_ids = r.keys('closed:*')
-    history_list = []
+    """
+    Histórico de leilões encerrados (Redis + arquivo frio), mais recentes primeiro,
+    paginado com ?pagina= e ?por_pagina=. O total vai no header X-Total-Count.
+    """
+    try:
+        pagina, por_pagina = parse_paginacao(request.args)
+    except ValueError:
+        return jsonify({"erro": "Parâmetros de paginação inválidos."}), 400
+
+    # Quentes: só os fechados há menos de ARCHIVE_AFTER_SECONDS (o arquivador tira o resto)
+    quentes = sorted((int(i) for i in r.zrange(archiver.CLOSED_INDEX, 0, -1)), reverse=True)
+    frios, ids_frios = archiver.get_archived_history()
     
-    for key in closed_ids:
-        auction_id = key.split(':')[1]
-        data = r.hgetall(key)
+    # Durante o arquivamento o leilão pode estar nos dois lados: vale o quente
+    em_ambos = sum(1 for auction_id in quentes if auction_id in ids_frios)
+    total = len(quentes) + len(frios) - em_ambos
+    
+    conjunto_quente = set(quentes)
+    mesclados = heapq.merge(
+        ((auction_id, None) for auction_id in quentes),
+        ((int(data['id']), data) for data in frios if int(data['id']) not in conjunto_quente),
+        key=lambda item: -item[0]
+    )
+    pagina_itens = list(itertools.islice(mesclados, (pagina - 1) * por_pagina, pagina * por_pagina))
+    
+    pipe = r.pipeline(transaction=False)
+    for auction_id, data in pagina_itens:
+        if data is None:
+            pipe.hgetall(f'closed:{auction_id}')
+    dados_quentes = iter(pipe.execute())
+    
+    history = []
+    for auction_id, data in pagina_itens:
+        if data is None:
+            data = next(dados_quentes)
+            if not data:
+                continue
+        history.append(_history_entry(auction_id, data))
         
-        vencedor_nome = data.get('vencedor_nome', 'N/A')
+    return jsonify(history), 200, {'X-Total-Count': str(total)}
+
+def _user_auction_page(user_id, tipo):
+    """Monta uma página de um índice do usuário (O(k), sem varrer todos os leilões)."""
+    try:
+        pagina, por_pagina = parse_paginacao(request.args)
+    except ValueError:
+        return jsonify({"erro": "Parâmetros de paginação inválidos."}), 400
+
+    total, ids = user_index.page(r, user_id, tipo, (pagina - 1) * por_pagina, por_pagina)
+    
+    pipe = r.pipeline(transaction=False)
+    for auction_id in ids:
+        pipe.hgetall(f'auction:{auction_id}')
+        pipe.hgetall(f'closed:{auction_id}')
+    dados = pipe.execute()
+    
+    # Leilões antigos já estão no armazenamento frio: uma consulta só para a página toda
+    arquivados = archiver.get_archived_summaries(
+        auction_id for i, auction_id in enumerate(ids) if not dados[2 * i] and not dados[2 * i + 1]
+    )
+    
+    resultados = []
+    for i, auction_id in enumerate(ids):
+        leilao, closed = dados[2 * i], dados[2 * i + 1]
+        if not leilao and not closed:
+            closed = arquivados.get(str(auction_id))
+            if closed is None:
+                continue
+            # O resumo arquivado não guarda o último licitante; nas vitórias ele é o próprio usuário
+            if tipo == user_index.WINS:
+                leilao = {"usuario_atual_id": str(user_id)}
         
-        history_list.append({
+        resultados.append({
             "id": int(auction_id),
-            "item": data.get('titulo', 'N/A'),
-            "descricao": f"Vencedor: {vencedor_nome}, Valor: R$ {data.get('valor_final', '0.0')}",
-            "status_final": data.get('status', 'N/A')
+            "titulo": leilao.get('titulo', closed.get('titulo', 'N/A')),
+            "lance_atual": float(leilao.get('lance_atual', closed.get('valor_final', 0))),
+            "usuario_atual_id": leilao.get('usuario_atual_id'),
+            "liderando": leilao.get('usuario_atual_id') == str(user_id),
+            "ativo": leilao.get('ativo') == 'True',
+            "horario_termino": leilao.get('horario_termino'),
+            "status_final": closed.get('status')
         })
-        
-    return jsonify(history_list), 200
+
+    return jsonify({
+        "total": total,
+        "pagina": pagina,
+        "por_pagina": por_pagina,
+        "resultados": resultados
+    }), 200
+
+@app.route('/user/<int:user_id>/auctions', methods=['GET'])
+def get_user_auctions(user_id):
+    """Leilões criados pelo usuário, mais recentes primeiro."""
+    return _user_auction_page(user_id, user_index.OWNED)
+
+@app.route('/user/<int:user_id>/bids', methods=['GET'])
+def get_user_bids(user_id):
+    """Leilões em que o usuário deu lance (com 'liderando'), último lance primeiro."""
+    return _user_auction_page(user_id, user_index.BIDS)
+
+@app.route('/user/<int:user_id>/wins', methods=['GET'])
+def get_user_wins(user_id):
+    """Leilões vencidos pelo usuário, mais recentes primeiro."""
+    return _user_auction_page(user_id, user_index.WINS)
 
 @app.route('/user/<int:user_id>/notifications', methods=['GET'])
 def check_vitoria_endpoint(user_id):
-    """Verifica e consome notificações de vitória do Redis para o cliente web."""
+    """
+    Verifica e consome notificações de vitória do Redis para o cliente web.
+    Com ?espera=N (segundos), aguarda no servidor até chegar uma notificação
+    (long-poll) em vez de o cliente ficar consultando uma lista vazia.
+    """
     # O Worker de IA envia notificações de vitória/derrota para 'user_notif:ID'
+    try:
+        espera = min(int(request.args.get('espera', 0)), NOTIF_MAX_ESPERA)
+    except ValueError:
+        return jsonify({"erro": "Parâmetro 'espera' inválido."}), 400
     
-    notificacoes = r.lrange(f'user_notif:{user_id}', 0, -1)
-    
-    # Consome as mensagens (limpa a lista)
-    if notificacoes:
-        r.ltrim(f'user_notif:{user_id}', len(notificacoes), -1)
-        
+    # LMPOP/BLMPOP retiram as mensagens atomicamente (sem a corrida do LRANGE + LTRIM)
+    chave = f'user_notif:{user_id}'
+    if espera > 0 and _vagas_longpoll.acquire(blocking=False):
+        try:
+            resultado = r.blmpop(espera, 1, chave, direction='LEFT', count=NOTIF_MAX)
+        finally:
+            _vagas_longpoll.release()
+        return jsonify(resultado[1] if resultado else []), 200
+
+    resultado = r.lmpop(1, chave, direction='LEFT', count=NOTIF_MAX)
+    notificacoes = resultado[1] if resultado else []
+    if espera > 0:
+        # Sem vaga para long-poll: o cliente espera um pouco antes de perguntar de novo
+        return jsonify(notificacoes), 200, {'Retry-After': str(NOTIF_RETRY_SEGUNDOS)}
     return jsonify(notificacoes), 200
 
 
 if __name__ == '__main__':
+    # Servidor de desenvolvimento. Em produção: gunicorn -c gunicorn.conf.py app:app
+    # (o seed roda à parte, via 'python seed.py' / k8s/seed-job.yaml)
+    from seed import check_and_seed
+
     # 🎯 EXECUÇÃO DOS DADOS INICIAIS
     try:
         if check_and_seed():
@@ -323,4 +633,8 @@ if __name__ == '__main__':
     except Exception as e:
         print(f"ATENÇÃO: Falha ao executar o seed: {e}. O sistema continuará.", flush=True)
 
-    app.run(host='0.0.0.0', port=5000)
\ No newline at end of file
+    if profiler.PROFILE_ENABLED:
+        profiler.start()
+    profiler.watch(r)
+
+    app.run(host='0.0.0.0', port=5000, threaded=True)
\ No newline at end of file
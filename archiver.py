@@ -0,0 +1,245 @@
+import redis
+import sqlite3
+import threading
+import zlib
+import json
+import os
+import time
+
+# --- CONFIGURAÇÃO ---
+
+# Tenta ler do ambiente K8s, fallback para redis-service
+REDIS_HOST = os.environ.get('REDIS_HOST', 'redis-service')
+REDIS_PORT = int(os.environ.get('REDIS_PORT', 6379))
+
+# Arquivo SQLite no volume compartilhado (armazenamento frio)
+ARCHIVE_PATH = os.environ.get('ARCHIVE_PATH', '/data/archive/leiloes.db')
+
+# Leilões fechados há mais tempo que isso saem do Redis e vão para o arquivo
+ARCHIVE_AFTER_SECONDS = int(os.environ.get('ARCHIVE_AFTER_SECONDS', 24 * 3600))
+ARCHIVE_BATCH = int(os.environ.get('ARCHIVE_BATCH', 200))
+ARCHIVE_INTERVAL_SECONDS = int(os.environ.get('ARCHIVE_INTERVAL_SECONDS', 300))
+
+# Sorted Set com os leilões fechados ainda no Redis (score = horário de fechamento)
+CLOSED_INDEX = 'closed_auctions'
+
+# Resumo do arquivo frio em memória, por processo. Leilões arquivados não mudam: o resumo
+# só é relido quando o arquivo muda (mtime/tamanho) e MAX(id) ou COUNT(*) também mudaram.
+_resumo = {"caminho": None, "assinatura": None, "versao": None, "lista": [], "ids": frozenset()}
+_resumo_lock = threading.Lock()
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS leiloes_arquivados (
+    id INTEGER PRIMARY KEY,
+    fechado_em REAL NOT NULL,
+    titulo TEXT,
+    status TEXT,
+    vencedor_nome TEXT,
+    valor_final TEXT,
+    dados BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_leiloes_fechado_em ON leiloes_arquivados (fechado_em);
+"""
+
+# --- ARMAZENAMENTO FRIO (SQLite) ---
+
+def _connect(readonly=False):
+    """
+    Abre o arquivo SQLite. Em modo leitura, retorna None se ele ainda não existir.
+
+    Usa o journal padrão (rollback), não WAL: o WAL precisa criar o arquivo -shm
+    ao lado do banco (impossível no volume montado como somente leitura na API)
+    e memória compartilhada num único host (não funciona entre pods num volume RWX).
+    """
+    if readonly:
+        if not os.path.exists(ARCHIVE_PATH):
+            return None
+        return sqlite3.connect(f'file:{ARCHIVE_PATH}?mode=ro', uri=True)
+
+    os.makedirs(os.path.dirname(ARCHIVE_PATH) or '.', exist_ok=True)
+    conn = sqlite3.connect(ARCHIVE_PATH)
+    # Converte arquivos criados em WAL por versões anteriores
+    conn.execute('PRAGMA journal_mode=DELETE')
+    conn.executescript(SCHEMA)
+    return conn
+
+def _ler(consulta, parametros=()):
+    """
+    Executa uma consulta só de leitura. Se o arquivo não existir ou estiver
+    ilegível no momento (ex.: escrita em andamento), retorna None: quem chama
+    segue só com os dados quentes em vez de responder 500.
+    """
+    try:
+        conn = _connect(readonly=True)
+        if conn is None:
+            return None
+        try:
+            return conn.execute(consulta, parametros).fetchall()
+        finally:
+            conn.close()
+    except sqlite3.Error as e:
+        print(f"AVISO: arquivo frio indisponível ({ARCHIVE_PATH}): {e}", flush=True)
+        return None
+
+def _compress(payload):
+    return zlib.compress(json.dumps(payload).encode('utf-8'), 6)
+
+def _decompress(blob):
+    return json.loads(zlib.decompress(blob).decode('utf-8'))
+
+RESUMO_COLUNAS = 'id, titulo, status, vencedor_nome, valor_final'
+
+def _linha_resumo(row):
+    return {
+        "id": str(row[0]),
+        "titulo": row[1] or 'N/A',
+        "status": row[2] or 'N/A',
+        "vencedor_nome": row[3] or 'N/A',
+        "valor_final": row[4] or '0.0'
+    }
+
+def _assinatura():
+    try:
+        st = os.stat(ARCHIVE_PATH)
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+def _resumo_atual():
+    """Resumo em cache; relê do SQLite só quando o arquivo ganhou leilões novos."""
+    assinatura = _assinatura()
+    with _resumo_lock:
+        if _resumo['caminho'] != ARCHIVE_PATH:
+            _resumo.update(caminho=ARCHIVE_PATH, assinatura=None, versao=None, lista=[], ids=frozenset())
+        if assinatura is None or assinatura == _resumo['assinatura']:
+            return _resumo
+
+        versao = _ler('SELECT MAX(id), COUNT(*) FROM leiloes_arquivados')
+        if versao is None:
+            return _resumo  # Ilegível agora: segue com o que já tinha e tenta de novo depois
+        if versao[0] != _resumo['versao']:
+            rows = _ler(f'SELECT {RESUMO_COLUNAS} FROM leiloes_arquivados ORDER BY id DESC')
+            if rows is None:
+                return _resumo
+            _resumo['lista'] = [_linha_resumo(row) for row in rows]
+            _resumo['ids'] = frozenset(row[0] for row in rows)
+            _resumo['versao'] = versao[0]
+        _resumo['assinatura'] = assinatura
+        return _resumo
+
+def get_archived_history():
+    """
+    Resumo (sem descomprimir) dos leilões arquivados, ID decrescente, e o conjunto
+    dos IDs. Retorna (lista, ids); a lista é compartilhada entre requisições: não alterar.
+    """
+    resumo = _resumo_atual()
+    return resumo['lista'], resumo['ids']
+
+def get_archived_summaries(auction_ids):
+    """
+    Resumo de vários leilões arquivados em uma única consulta, sem descomprimir
+    os registros. Retorna {id (str): resumo}; IDs fora do arquivo ficam de fora.
+    """
+    ids = [int(auction_id) for auction_id in auction_ids]
+    if not ids:
+        return {}
+    marcadores = ','.join('?' * len(ids))
+    rows = _ler(f'SELECT {RESUMO_COLUNAS} FROM leiloes_arquivados WHERE id IN ({marcadores})', ids) or []
+    return {str(row[0]): _linha_resumo(row) for row in rows}
+
+def get_archived(auction_id):
+    """Retorna o registro completo (closed, auction, bids) de um leilão arquivado."""
+    rows = _ler('SELECT dados FROM leiloes_arquivados WHERE id = ?', (int(auction_id),))
+    return _decompress(rows[0][0]) if rows else None
+
+def get_archived_bids(auction_id):
+    """Lances de um leilão arquivado, ordenados pelo valor (decrescente)."""
+    registro = get_archived(auction_id)
+    if registro is None:
+        return None
+    return [json.loads(bid) for bid, _ in sorted(registro['bids'], key=lambda b: b[1], reverse=True)]
+
+# --- ARQUIVAMENTO ---
+
+def backfill_closed_index(r):
+    """Indexa chaves closed:* criadas antes do índice existir (usa SCAN, não KEYS)."""
+    agora = time.time()
+    total = 0
+    for key in r.scan_iter(match='closed:*', count=500):
+        total += r.zadd(CLOSED_INDEX, {key.split(':', 1)[1]: agora}, nx=True)
+    return total
+
+def archive_closed_auctions(r, older_than=None, batch=None):
+    """
+    Move para o SQLite os leilões fechados há mais de `older_than` segundos
+    e remove suas chaves do Redis. Retorna quantos foram arquivados.
+    """
+    older_than = ARCHIVE_AFTER_SECONDS if older_than is None else older_than
+    batch = ARCHIVE_BATCH if batch is None else batch
+
+    limite = time.time() - older_than
+    ids = r.zrangebyscore(CLOSED_INDEX, '-inf', limite, start=0, num=batch, withscores=True)
+    if not ids:
+        return 0
+
+    pipe = r.pipeline(transaction=False)
+    for auction_id, _ in ids:
+        pipe.hgetall(f'closed:{auction_id}')
+        pipe.hgetall(f'auction:{auction_id}')
+        pipe.zrange(f'bids:{auction_id}', 0, -1, withscores=True)
+    resultados = pipe.execute()
+
+    linhas = []
+    for i, (auction_id, fechado_em) in enumerate(ids):
+        closed, leilao, bids = resultados[3 * i:3 * i + 3]
+        registro = {"closed": closed, "auction": leilao, "bids": bids}
+        linhas.append((
+            int(auction_id),
+            fechado_em,
+            closed.get('titulo', leilao.get('titulo')),
+            closed.get('status'),
+            closed.get('vencedor_nome'),
+            closed.get('valor_final'),
+            _compress(registro)
+        ))
+
+    # 1. Grava no armazenamento frio antes de apagar do Redis (nada se perde se cair no meio)
+    conn = _connect()
+    try:
+        with conn:
+            conn.executemany(
+                'INSERT OR REPLACE INTO leiloes_arquivados '
+                '(id, fechado_em, titulo, status, vencedor_nome, valor_final, dados) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?)', linhas
+            )
+    finally:
+        conn.close()
+
+    # 2. Remove as chaves quentes
+    pipe = r.pipeline()
+    for auction_id, _ in ids:
+        pipe.delete(f'closed:{auction_id}', f'auction:{auction_id}', f'bids:{auction_id}',
+                    f'seq:{auction_id}', f'replay:{auction_id}')
+        pipe.zrem(CLOSED_INDEX, auction_id)
+    pipe.execute()
+
+    print(f"🗄️ {len(ids)} leilões arquivados em {ARCHIVE_PATH}.", flush=True)
+    return len(ids)
+
+def run_forever():
+    """Loop standalone do arquivador (o ai_worker também o chama periodicamente)."""
+    r = redis.StrictRedis(host=REDIS_HOST, port=REDIS_PORT, decode_responses=True)
+    backfill_closed_index(r)
+    print(f"Arquivador iniciado. Limite: {ARCHIVE_AFTER_SECONDS}s, arquivo: {ARCHIVE_PATH}", flush=True)
+
+    while True:
+        try:
+            # Esvazia o backlog em lotes antes de dormir
+            while archive_closed_auctions(r) == ARCHIVE_BATCH:
+                pass
+        except Exception as e:
+            print(f"ERRO no arquivador: {e}", flush=True)
+        time.sleep(ARCHIVE_INTERVAL_SECONDS)
+
+if __name__ == '__main__':
+    run_forever()
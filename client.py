@@ -4,11 +4,24 @@ import json
 import time
 import threading 
 import redis 
+import redis.asyncio as aioredis
+import aiohttp
+import asyncio
+import argparse
+import random
 import sys
 import datetime
 
 # --- CONFIGURAÇÃO ---
-API_URL = "http://127.0.0.1:5000"
+API_URL = os.environ.get('API_URL', "http://127.0.0.1:5000")
+REDIS_HOST = os.environ.get('REDIS_HOST', '127.0.0.1')
+REDIS_PORT = int(os.environ.get('REDIS_PORT', 6379))
+
+# Sessão HTTP compartilhada: reaproveita conexões TCP (keep-alive) entre chamadas
+SESSION = requests.Session()
+
+# Modo --bot: máximo de conexões HTTP simultâneas do pool assíncrono
+BOT_MAX_CONEXOES = int(os.environ.get('BOT_MAX_CONEXOES', 100))
 
 # Variáveis globais para o usuário logado e estado
 USER_ID = None
@@ -17,49 +30,96 @@ SUBSCRIBED_AUCTIONS = set()
 PUBSUB_OBJECT = None        
 IS_NOTIFYING = False        
 ALERTA_LANCE = None # Variável para armazenar a mensagem de alerta persistente
+ULTIMO_SEQ = {}     # Última sequência vista por leilão (para recuperar eventos após reconectar)
 
 # --- FUNÇÕES DE PUB/SUB ---
 
+def recuperar_eventos(auction_id):
+    """Busca na API os eventos do leilão publicados depois da última sequência vista."""
+    global ALERTA_LANCE
+    try:
+        response = SESSION.get(f"{API_URL}/auction/{auction_id}/events",
+                               params={'desde': ULTIMO_SEQ.get(auction_id, 0)})
+        data = response.json()
+    except (requests.exceptions.RequestException, ValueError):
+        return
+
+    if data.get('resync'):
+        # Perdemos mais eventos do que o log guarda: o estado atual vem da tela de status
+        ULTIMO_SEQ[auction_id] = data['seq_atual']
+        ALERTA_LANCE = f"⚠️ Perdemos atualizações do leilão ID: {auction_id}. Recarregue para ver o estado atual."
+        print("\n" + ALERTA_LANCE)
+        return
+
+    for evento in data.get('eventos', []):
+        tratar_evento(auction_id, evento)
+
+def tratar_evento(auction_id, data):
+    """Aplica um evento do leilão na ordem da sequência, ignorando repetidos."""
+    global IS_NOTIFYING, ALERTA_LANCE
+
+    seq = data.get('seq')
+    if seq is not None:
+        ultimo = ULTIMO_SEQ.get(auction_id)
+        if ultimo is not None and seq <= ultimo:
+            return  # Já visto (chegou pelo replay e pelo Pub/Sub)
+        if ultimo is not None and seq > ultimo + 1:
+            recuperar_eventos(auction_id)  # Buraco: o replay entrega os que faltaram
+            return
+        ULTIMO_SEQ[auction_id] = seq
+
+    if data.get('tipo') == 'encerrado':
+        IS_NOTIFYING = True
+        ALERTA_LANCE = f"🏁 O LEILÃO ID: {auction_id} FOI FINALIZADO ({data['status']})."
+        print("\n" + "#"*70)
+        print(ALERTA_LANCE)
+        print("#"*70 + "\n")
+        return
+
+    if int(data.get('user_id', 0)) != USER_ID:
+        
+        IS_NOTIFYING = True 
+        
+        # 1. Armazena a mensagem completa para ser exibida na próxima recarga
+        ALERTA_LANCE = (
+            f"🚨 UM NOVO LANCE FOI DADO NO LEILÃO ID: {auction_id} EM QUE VOCÊ ESTÁ PARTICIPANDO.\n"
+            f"  > Novo Lance: R$ {data['valor']:.2f} por {data['user_name']}"
+        )
+        
+        # 2. Imprime a mensagem no console para 'quebrar' o input() bloqueado
+        print("\n" + "#"*70)
+        print(ALERTA_LANCE)
+        print("\n--- Pressione ENTER para recarregar e ver o novo status ---")
+        print("#"*70 + "\n")
+
 def pubsub_listener():
     """
     Thread de escuta com lógica de auto-reconexão do Redis e notificação.
     """
-    global PUBSUB_OBJECT, IS_NOTIFYING, ALERTA_LANCE
+    global PUBSUB_OBJECT
     
     while True: # Loop externo para reconexão
         try:
-            r_pubsub = redis.StrictRedis(host='127.0.0.1', port=6379, decode_responses=True)
+            r_pubsub = redis.StrictRedis(host=REDIS_HOST, port=REDIS_PORT, decode_responses=True)
             PUBSUB_OBJECT = r_pubsub.pubsub()
             
             if SUBSCRIBED_AUCTIONS:
                 channels_to_resubscribe = [f'bid_updates:{id}' for id in SUBSCRIBED_AUCTIONS]
                 PUBSUB_OBJECT.subscribe(*channels_to_resubscribe)
 
-            # Loop interno de escuta
+                # Já inscrito de novo: busca o que foi publicado enquanto a conexão esteve caída
+                for auction_id in list(SUBSCRIBED_AUCTIONS):
+                    recuperar_eventos(auction_id)
+
+            # Loop interno de escuta: bloqueia no socket até chegar evento (sem sleep/polling)
             while True: 
-                mensagem = PUBSUB_OBJECT.parse_response(block=False, timeout=1) 
+                mensagem = PUBSUB_OBJECT.get_message(ignore_subscribe_messages=True, timeout=1.0) 
                 
-                if mensagem and isinstance(mensagem, list) and mensagem[0] == b'message':
-                    
-                    data = json.loads(mensagem[3])
-                    
-                    if int(data.get('user_id', 0)) != USER_ID:
-                        
-                        IS_NOTIFYING = True 
-                        
-                        # 1. Armazena a mensagem completa para ser exibida na próxima recarga
-                        ALERTA_LANCE = (
-                            f"🚨 UM NOVO LANCE FOI DADO NO LEILÃO {data['titulo']} (ID: {data['auction_id']}) EM QUE VOCÊ ESTÁ PARTICIPANDO.\n"
-                            f"  > Novo Lance: R$ {data['valor']:.2f} por {data['usuario']}"
-                        )
-                        
-                        # 2. Imprime a mensagem no console para 'quebrar' o input() bloqueado
-                        print("\n" + "#"*70)
-                        print(ALERTA_LANCE)
-                        print("\n--- Pressione ENTER para recarregar e ver o novo status ---")
-                        print("#"*70 + "\n")
+                if mensagem and mensagem['type'] == 'message':
                     
-                time.sleep(0.1) 
+                    data = json.loads(mensagem['data'])
+                    auction_id = mensagem['channel'].split(':', 1)[1]
+                    tratar_evento(auction_id, data)
         
         except redis.exceptions.ConnectionError:
             print(f"\n🔴 [PUB/SUB ERRO] Conexão com o Redis perdida. Tentando reconectar em 5s...")
@@ -85,7 +145,7 @@ def registrar_usuario():
         nome = input("Digite seu nome de usuário: ")
         if not nome: continue
         try:
-            response = requests.post(f"{API_URL}/register", json={'nome': nome})
+            response = SESSION.post(f"{API_URL}/register", json={'nome': nome})
             if response.status_code == 201:
                 data = response.json()
                 return data['user_id'], data['nome']
@@ -98,7 +158,7 @@ def registrar_usuario():
 
 def mostrar_notificacoes(user_id):
     try:
-        response = requests.get(f"{API_URL}/user/{user_id}/notifications")
+        response = SESSION.get(f"{API_URL}/user/{user_id}/notifications")
         if response.status_code == 200:
             notificacoes = response.json()
             if notificacoes:
@@ -131,7 +191,7 @@ def mostrar_status(user_id):
     print("--- LEILÕES ATIVOS ---")
     
     try:
-        response = requests.get(f"{API_URL}/auction/status")
+        response = SESSION.get(f"{API_URL}/auction/status")
         if response.status_code == 200:
             leiloes_ativos = response.json()
             if not leiloes_ativos:
@@ -155,7 +215,7 @@ def criar_leilao(user_id):
         titulo = input("Título do novo leilão: ")
         preco_inicial = float(input("Preço inicial: R$ "))
         duracao = int(input("Duração (em minutos): "))
-        response = requests.post(f"{API_URL}/auction/create", json={
+        response = SESSION.post(f"{API_URL}/auction/create", json={
             'user_id': user_id, 'titulo': titulo, 'preco_inicial': preco_inicial, 'duracao_minutos': duracao
         })
         data = response.json()
@@ -173,7 +233,7 @@ def mostrar_historico():
     limpar_tela()
     print("\n--- HISTÓRICO GERAL DE LEILÕES ENCERRADOS ---")
     try:
-        response = requests.get(f"{API_URL}/auction/history")
+        response = SESSION.get(f"{API_URL}/auction/history")
         if response.status_code == 200:
             historico = response.json()
             if not historico:
@@ -195,7 +255,7 @@ def fazer_lance(user_id):
         auction_id = input("Digite o ID do Leilão para o lance: ")
         valor = float(input("Digite o valor do seu lance: R$ "))
         
-        response = requests.post(f"{API_URL}/auction/bid", json={
+        response = SESSION.post(f"{API_URL}/auction/bid", json={
             'user_id': user_id,
             'auction_id': auction_id,
             'valor': valor
@@ -211,8 +271,11 @@ def fazer_lance(user_id):
             if auction_id not in SUBSCRIBED_AUCTIONS:
                 if PUBSUB_OBJECT:
                     print(f"--> Inscrevendo no canal: {channel_name}...")
+                    ULTIMO_SEQ[auction_id] = data['seq']
                     PUBSUB_OBJECT.subscribe(channel_name) 
                     SUBSCRIBED_AUCTIONS.add(auction_id)
+                    # Lances que chegaram entre o nosso e a inscrição
+                    recuperar_eventos(auction_id)
                 else:
                     print("--> Aviso: Pub/Sub Listener ainda não está pronto. Tente refazer o lance em 5s.")
 
@@ -227,8 +290,151 @@ def fazer_lance(user_id):
     input("\nPressione Enter para continuar...")
 
 
+# --- MODO BOT (ASSÍNCRONO, SEM INTERFACE) ---
+
+async def _api_json(session, estado, metodo, caminho, **kwargs):
+    """Faz uma chamada à API pelo pool assíncrono e contabiliza latência/erros."""
+    inicio = time.perf_counter()
+    try:
+        async with session.request(metodo, f"{API_URL}{caminho}", **kwargs) as resp:
+            data = await resp.json()
+            estado['latencias'].append(time.perf_counter() - inicio)
+            return resp.status, data
+    except (aiohttp.ClientError, asyncio.TimeoutError, ValueError):
+        estado['erros'] += 1
+        return None, None
+
+async def _atualizar_precos(session, estado, fim):
+    """Recarrega a lista de leilões ativos de tempos em tempos (os eventos cobrem o resto)."""
+    while time.monotonic() < fim:
+        status, leiloes = await _api_json(session, estado, 'GET', '/auction/status')
+        if status == 200:
+            for leilao in leiloes:
+                auction_id = str(leilao['id'])
+                estado['precos'][auction_id] = max(estado['precos'].get(auction_id, 0), leilao['lance_atual'])
+                estado['lider'].setdefault(auction_id, str(leilao['usuario_atual_id']))
+        await asyncio.sleep(min(10, max(0, fim - time.monotonic())))
+
+async def _escutar_lances(estado, fim):
+    """
+    Uma única assinatura Pub/Sub (psubscribe) compartilhada por todos os bots.
+    Atualiza os preços e avisa o bot que acabou de ser superado.
+    """
+    while time.monotonic() < fim:
+        r_async = aioredis.Redis(host=REDIS_HOST, port=REDIS_PORT, decode_responses=True)
+        pubsub = r_async.pubsub()
+        try:
+            await pubsub.psubscribe('bid_updates:*')
+            while time.monotonic() < fim:
+                mensagem = await pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+                if not mensagem:
+                    continue
+
+                data = json.loads(mensagem['data'])
+                auction_id = mensagem['channel'].split(':', 1)[1]
+                if data.get('tipo') == 'encerrado':
+                    # Leilão fechado: sai da lista de alvos dos bots
+                    estado['precos'].pop(auction_id, None)
+                    estado['lider'].pop(auction_id, None)
+                    continue
+
+                anterior = estado['lider'].get(auction_id)
+                novo_lider = str(data['user_id'])
+
+                estado['eventos'] += 1
+                estado['precos'][auction_id] = max(estado['precos'].get(auction_id, 0), float(data['valor']))
+                estado['lider'][auction_id] = novo_lider
+
+                if anterior in estado['filas'] and anterior != novo_lider:
+                    estado['filas'][anterior].put_nowait(auction_id)
+        except (redis.exceptions.RedisError, OSError) as e:
+            print(f"🔴 [BOT] Falha na escuta do Redis ({e}). Tentando reconectar em 5s...")
+            await asyncio.sleep(5)
+        finally:
+            await pubsub.aclose()
+            await r_async.aclose()
+
+async def _bot(session, estado, user_id, fim):
+    """Um licitante simulado: reage quando é superado ou dá lances aleatórios."""
+    fila = estado['filas'][user_id]
+    while time.monotonic() < fim:
+        try:
+            # Espera ser superado (evento) ou o "tempo de pensar" acabar
+            auction_id = await asyncio.wait_for(fila.get(), timeout=random.uniform(0.5, 3.0))
+        except asyncio.TimeoutError:
+            if not estado['precos']:
+                continue
+            auction_id = random.choice(list(estado['precos']))
+
+        if estado['lider'].get(auction_id) == user_id:
+            continue
+
+        # O leilão pode ter fechado enquanto o ID esperava na fila
+        preco = estado['precos'].get(auction_id)
+        if preco is None:
+            continue
+
+        valor = round(preco * random.uniform(1.01, 1.10) + 0.01, 2)
+        status, _ = await _api_json(session, estado, 'POST', '/auction/bid', json={
+            'user_id': user_id, 'auction_id': auction_id, 'valor': valor
+        })
+        if status == 200:
+            estado['lances_aceitos'] += 1
+        elif status is not None:
+            estado['lances_recusados'] += 1
+
+async def rodar_bots(num_bots, duracao):
+    """Roda `num_bots` licitantes simulados em um único processo e imprime um resumo."""
+    estado = {
+        "precos": {}, "lider": {}, "filas": {}, "latencias": [],
+        "eventos": 0, "erros": 0, "lances_aceitos": 0, "lances_recusados": 0
+    }
+    conector = aiohttp.TCPConnector(limit=BOT_MAX_CONEXOES)
+
+    async with aiohttp.ClientSession(connector=conector) as session:
+        registros = await asyncio.gather(*[
+            _api_json(session, estado, 'POST', '/register', json={'nome': f"Bot {i}"})
+            for i in range(num_bots)
+        ])
+        bots = [str(data['user_id']) for status, data in registros if status == 201]
+        if not bots:
+            print("Nenhum bot registrado. O servidor Flask está acessível?")
+            return
+        for user_id in bots:
+            estado['filas'][user_id] = asyncio.Queue()
+
+        print(f"🤖 {len(bots)} bots ativos por {duracao}s contra {API_URL}...")
+        inicio = time.monotonic()
+        fim = inicio + duracao
+        await asyncio.gather(
+            _escutar_lances(estado, fim),
+            _atualizar_precos(session, estado, fim),
+            *[_bot(session, estado, user_id, fim) for user_id in bots]
+        )
+
+    latencias = sorted(estado['latencias'])
+    decorrido = time.monotonic() - inicio
+    print("\n" + "="*50)
+    print(f"Requisições: {len(latencias)} ({len(latencias) / decorrido:.1f} req/s) | Erros: {estado['erros']}")
+    print(f"Lances aceitos: {estado['lances_aceitos']} | Recusados: {estado['lances_recusados']} | Eventos recebidos: {estado['eventos']}")
+    if latencias:
+        p50 = latencias[len(latencias) // 2] * 1000
+        p95 = latencias[int(len(latencias) * 0.95)] * 1000
+        print(f"Latência: p50 {p50:.1f} ms | p95 {p95:.1f} ms")
+    print("="*50)
+
+
 # --- INÍCIO DA EXECUÇÃO ---
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Cliente do Sistema de Leilão")
+    parser.add_argument('--bot', type=int, metavar='N', help="Roda N licitantes simulados, sem interface")
+    parser.add_argument('--duracao', type=int, default=60, help="Duração do modo --bot em segundos")
+    args = parser.parse_args()
+
+    if args.bot:
+        asyncio.run(rodar_bots(args.bot, args.duracao))
+        sys.exit()
+
     USER_ID, NOME_USUARIO = registrar_usuario()
     
     if USER_ID is None:
@@ -0,0 +1,38 @@
+# gunicorn.conf.py
+# Configuração de produção da API: gunicorn -c gunicorn.conf.py app:app
+
+import os
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:5000')
+
+# Processos pré-forkados (1 a 2 por core) e threads por processo.
+# Cada long-poll de notificações prende uma thread por até NOTIF_MAX_ESPERA segundos;
+# o app limita isso a NOTIF_MAX_LONGPOLL por processo (padrão: threads // 2), então
+# o restante das threads fica sempre livre para lances, status e health checks.
+workers = int(os.environ.get('WEB_CONCURRENCY', 2))
+threads = int(os.environ.get('GUNICORN_THREADS', 8))
+worker_class = 'gthread'
+
+# Importa o app uma vez no master: os workers sobem por fork, sem reimportar nada
+preload_app = True
+
+# Precisa ser maior que a espera máxima do long-poll (NOTIF_MAX_ESPERA)
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 60))
+keepalive = 5
+graceful_timeout = 20
+
+accesslog = '-' if os.environ.get('GUNICORN_ACCESS_LOG', '0') == '1' else None
+errorlog = '-'
+
+def post_fork(server, worker):
+    """Cada worker cria o seu pool Redis (sockets não são compartilhados entre processos)."""
+    import app as api
+    import profiler
+
+    api.configure_redis(api.new_redis_client())
+
+    # O amostrador roda só nos workers (nunca no master) e segue o controle
+    # compartilhado de /admin/profiler
+    if profiler.PROFILE_ENABLED:
+        profiler.start()
+    profiler.watch(api.r)
@@ -0,0 +1,555 @@
+import redis
+import requests
+import json
+import time
+import datetime
+import os
+import sys
+import random
+import shutil
+import socket
+import argparse
+import tempfile
+import threading
+import subprocess
+import traceback
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import app
+import ai_worker
+import seed
+import archiver
+import ranking
+import replay
+import search_index
+
+# --- CONFIGURAÇÃO ---
+
+# Orçamentos de latência (p95, em ms) por rota, válidos contra um redis-server real.
+# Com o fakeredis os tempos só são reportados: ele não é representativo.
+ORCAMENTOS_MS = {
+    "POST /auction/bid": 15,
+    "GET /auction/search": 15,
+    # Alvo (não verificado): < 1 ms com 100k leilões. Até aqui só rodou no fakeredis,
+    # onde a busca com termos leva ~140 ms; falta a medição contra um redis-server real.
+    "busca em escala (Redis)": 1,
+    "GET /auction/ranking": 10,
+    "GET /auction/<id>/events": 10,
+    "GET /user/<id>/notifications": 10,
+    "GET /auction/status": 500,
+}
+
+# --- REDIS DESCARTÁVEL ---
+
+def _porta_livre():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+def iniciar_redis(tcp=False):
+    """
+    Sobe um redis-server temporário (sem persistência) em uma porta livre.
+    Sem o binário, usa o fakeredis: em memória, ou servindo TCP se `tcp`
+    (necessário quando outro processo, como o gunicorn, precisa conectar).
+    Retorna (cliente, descrição, porta, parar).
+    """
+    binario = shutil.which('redis-server')
+    if binario:
+        porta = _porta_livre()
+        proc = subprocess.Popen(
+            [binario, '--port', str(porta), '--save', '', '--appendonly', 'no'],
+            stdout=subprocess.DEVNULL
+        )
+        cliente = redis.StrictRedis(connection_pool=redis.ConnectionPool(port=porta, decode_responses=True))
+        for _ in range(50):
+            try:
+                cliente.ping()
+                break
+            except redis.exceptions.ConnectionError:
+                time.sleep(0.1)
+
+        def parar():
+            proc.terminate()
+            proc.wait()
+        return cliente, f"redis-server na porta {porta}", porta, parar
+
+    try:
+        import fakeredis
+    except ImportError:
+        sys.exit("ERRO: instale o redis-server ou o pacote fakeredis para rodar o harness.")
+
+    if tcp:
+        porta = _porta_livre()
+        servidor = fakeredis.TcpFakeServer(('127.0.0.1', porta), server_type='redis')
+        threading.Thread(target=servidor.serve_forever, daemon=True).start()
+        cliente = redis.StrictRedis(port=porta, decode_responses=True)
+        return cliente, f"fakeredis TCP na porta {porta}", porta, servidor.shutdown
+
+    cliente = fakeredis.FakeStrictRedis(server=fakeredis.FakeServer(), decode_responses=True)
+    return cliente, "fakeredis (em memória)", None, lambda: None
+
+# --- WEBHOOK FALSO (no lugar do Discord) ---
+
+class _WebhookHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        tamanho = int(self.headers.get('Content-Length', 0))
+        self.server.recebidos.append(json.loads(self.rfile.read(tamanho)))
+        self.send_response(204)
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+def iniciar_webhook():
+    """Servidor HTTP local que guarda os payloads recebidos em `recebidos`."""
+    servidor = ThreadingHTTPServer(('127.0.0.1', 0), _WebhookHandler)
+    servidor.recebidos = []
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    return servidor
+
+# --- HARNESS ---
+
+class Harness:
+    """Injeta um Redis descartável na API, no worker e no seed e roda cenários ponta a ponta."""
+
+    def __init__(self, cliente, webhook):
+        self.r = cliente
+        self.webhook = webhook
+        self.http = app.app.test_client()
+        self.latencias = {}
+
+        app.configure_redis(cliente)
+        ai_worker.configure_redis(cliente)
+        seed.configure_redis(cliente)
+        ai_worker.DISCORD_WEBHOOK_URL = f"http://127.0.0.1:{webhook.server_port}/webhook"
+
+    def reset(self):
+        """Cada cenário começa com o Redis vazio e assinando o canal de eventos."""
+        self.r.flushdb()
+        self.webhook.recebidos.clear()
+        ai_worker.ultimo_canal_seq = None
+        self.pubsub = self.r.pubsub()
+        self.pubsub.subscribe(app.CANAL_EVENTOS)
+        self.pubsub.get_message(timeout=1.0)  # confirmação do subscribe
+
+    def chamar(self, metodo, url, rota=None, **kwargs):
+        """Chama a API (test client do Flask) e registra a latência da rota."""
+        inicio = time.perf_counter()
+        resp = self.http.open(url, method=metodo, **kwargs)
+        self.latencias.setdefault(rota or f"{metodo} {url.split('?')[0]}", []).append(time.perf_counter() - inicio)
+        return resp
+
+    def registrar(self, nome):
+        return self.chamar('POST', '/register', json={'nome': nome}).json['user_id']
+
+    def criar(self, user_id, titulo, preco_inicial):
+        resp = self.chamar('POST', '/auction/create', json={
+            'user_id': user_id, 'titulo': titulo, 'preco_inicial': preco_inicial, 'duracao_minutos': 5
+        })
+        assert resp.status_code == 201, resp.json
+        return resp.json['auction_id']
+
+    def lance(self, user_id, auction_id, valor):
+        return self.chamar('POST', '/auction/bid', json={
+            'user_id': user_id, 'auction_id': auction_id, 'valor': valor
+        })
+
+    def notificacoes(self, user_id):
+        return self.chamar('GET', f'/user/{user_id}/notifications', rota='GET /user/<id>/notifications').json
+
+    def expirar(self, auction_id):
+        """Leva o término do leilão para o passado (equivale a esperar a duração)."""
+        self.r.hset(f'auction:{auction_id}', 'horario_termino', '2000-01-01 00:00:00')
+
+    def processar_eventos(self):
+        """Entrega ao worker os eventos publicados no canal, como o loop dele faria."""
+        eventos = []
+        while True:
+            mensagem = self.pubsub.get_message(ignore_subscribe_messages=True, timeout=0.5)
+            if not mensagem:
+                return eventos
+            data = json.loads(mensagem['data'])
+            ai_worker.processar_evento(data)
+            eventos.append((data['auction_id'], data['status']))
+
+# --- CENÁRIOS ---
+
+def cenario_ciclo_completo(h):
+    """Cria, dá lances, expira, fecha, notifica e arquiva um leilão com vencedor."""
+    dono = h.registrar("Dono Harness")
+    licitante = h.registrar("Licitante Harness")
+    auction_id = h.criar(dono, "Câmera Teste Harness", 100)
+
+    assert h.lance(licitante, auction_id, 90).status_code == 400, "lance abaixo do atual aceito"
+    assert h.lance(dono, auction_id, 200).status_code == 400, "dono deu lance no próprio leilão"
+    assert h.lance(licitante, auction_id, 150).status_code == 200
+
+    busca = h.chamar('GET', '/auction/search?q=camera harness').json
+    assert [l['id'] for l in busca['resultados']] == [int(auction_id)], busca
+
+    for tipo in ('velocidade', 'lances', 'encerrando'):
+        topo = h.chamar('GET', f'/auction/ranking?tipo={tipo}', rota='GET /auction/ranking').json
+        assert [l['id'] for l in topo['resultados']] == [int(auction_id)], topo
+
+    proprios = h.chamar('GET', f'/user/{dono}/auctions', rota='GET /user/<id>/auctions').json
+    assert [l['id'] for l in proprios['resultados']] == [int(auction_id)], proprios
+    lances = h.chamar('GET', f'/user/{licitante}/bids', rota='GET /user/<id>/bids').json
+    assert lances['total'] == 1 and lances['resultados'][0]['liderando'], lances
+
+    h.expirar(auction_id)
+    status = h.chamar('GET', '/auction/status').json
+    assert int(auction_id) not in [l['id'] for l in status], "leilão expirado continua ativo"
+    assert h.r.zscore('rank:lances', auction_id) is None, "leilão fechado continua no ranking"
+
+    # Lance que corre com o fechamento (pipeline executado depois do remove_auction)
+    pipe = h.r.pipeline()
+    ranking.record_bid(pipe, auction_id, quantidade=1000)
+    pipe.execute()
+    assert h.r.zscore('rank:lances', auction_id) is None, "lance atrasado recriou leilão fechado no ranking"
+    for tipo in ('velocidade', 'lances'):
+        assert ranking.top(h.r, tipo, 5) == [], f"leilão fechado no ranking de {tipo}"
+
+    eventos = h.processar_eventos()
+    assert eventos == [(auction_id, "ENCERRADO")], eventos
+    assert len(h.webhook.recebidos) == 1, h.webhook.recebidos
+    assert h.webhook.recebidos[0]['embeds'][0]['title'].endswith(f"#{auction_id}")
+
+    notificacoes = h.notificacoes(licitante)
+    assert len(notificacoes) == 1 and "PARABÉNS" in notificacoes[0], notificacoes
+    assert h.notificacoes(licitante) == [], "notificação entregue duas vezes"
+
+    # Sem vaga de long-poll: responde na hora com Retry-After em vez de prender a thread
+    vagas, app._vagas_longpoll = app._vagas_longpoll, threading.BoundedSemaphore(1)
+    try:
+        app._vagas_longpoll.acquire()
+        inicio = time.perf_counter()
+        resp = h.chamar('GET', f'/user/{licitante}/notifications?espera=5', rota='GET /user/<id>/notifications')
+        assert time.perf_counter() - inicio < 1 and resp.headers.get('Retry-After'), "long-poll acima do limite"
+    finally:
+        app._vagas_longpoll = vagas
+    vitorias = h.chamar('GET', f'/user/{licitante}/wins', rota='GET /user/<id>/wins').json
+    assert [l['status_final'] for l in vitorias['resultados']] == ['ENCERRADO'], vitorias
+
+    historico = h.chamar('GET', '/auction/history').json
+    assert [(l['id'], l['status_final']) for l in historico] == [(int(auction_id), 'ENCERRADO')], historico
+
+    assert archiver.archive_closed_auctions(h.r, older_than=0) == 1
+    assert not h.r.exists(f'auction:{auction_id}', f'closed:{auction_id}', f'bids:{auction_id}')
+    assert h.chamar('GET', '/auction/history').json == historico, "histórico mudou após arquivar"
+
+    # Arquivo frio sem mudanças: o resumo vem do cache, sem consultar o SQLite
+    ler, leituras = archiver._ler, []
+    archiver._ler = lambda *args: leituras.append(args) or ler(*args)
+    try:
+        resp = h.chamar('GET', '/auction/history?por_pagina=1')
+        assert resp.headers['X-Total-Count'] == '1' and len(resp.json) == 1, resp.headers
+        assert h.chamar('GET', '/auction/history?pagina=2').json == []
+        assert leituras == [], f"histórico releu o arquivo sem mudanças: {leituras}"
+    finally:
+        archiver._ler = ler
+    assert h.chamar('GET', '/auction/history?por_pagina=0').status_code == 400
+    lances = h.chamar('GET', f'/auction/{auction_id}/bids', rota='GET /auction/<id>/bids').json
+    assert [l['valor'] for l in lances] == [150.0], lances
+    # Do arquivo vem só o resumo do leilão (sem o horário de término)
+    ler, leituras = archiver._ler, []
+    archiver._ler = lambda *args: leituras.append(args) or ler(*args)
+    try:
+        arquivadas = h.chamar('GET', f'/user/{licitante}/wins', rota='GET /user/<id>/wins').json
+    finally:
+        archiver._ler = ler
+    assert len(leituras) == 1, f"página de vitórias fez {len(leituras)} consultas ao arquivo"
+    for vitoria in vitorias['resultados']:
+        vitoria['horario_termino'] = None
+    assert arquivadas == vitorias, f"vitória sumiu após arquivar: {arquivadas}"
+
+    # Arquivo frio ilegível: as rotas seguem só com os dados quentes, sem 500
+    caminho, archiver.ARCHIVE_PATH = archiver.ARCHIVE_PATH, archiver.ARCHIVE_PATH + '.corrompido'
+    try:
+        with open(archiver.ARCHIVE_PATH, 'wb') as f:
+            f.write(b'nao e sqlite' * 100)
+        assert h.chamar('GET', '/auction/history').json == []
+        assert h.chamar('GET', f'/auction/{auction_id}/bids', rota='GET /auction/<id>/bids').status_code == 200
+    finally:
+        archiver.ARCHIVE_PATH = caminho
+
+def cenario_cancelado(h):
+    """Leilão sem lances é cancelado, avisa o webhook e não notifica ninguém."""
+    dono = h.registrar("Dono Sem Lances")
+    auction_id = h.criar(dono, "Item Encalhado", 50)
+
+    h.expirar(auction_id)
+    h.chamar('GET', '/auction/status')
+
+    eventos = h.processar_eventos()
+    assert eventos == [(auction_id, "CANCELADO")], eventos
+    assert len(h.webhook.recebidos) == 1
+    assert h.notificacoes(dono) == []
+    assert h.chamar('GET', '/auction/search?q=encalhado').json['total'] == 0, "cancelado continua indexado"
+
+def cenario_replay(h):
+    """Quem reconecta recupera os eventos perdidos pela sequência, sem buracos nem duplicatas."""
+    dono = h.registrar("Dono Replay")
+    licitante = h.registrar("Licitante Replay")
+    auction_id = h.criar(dono, "Relógio Replay", 10)
+
+    seqs = [h.lance(licitante, auction_id, 11 + i).json['seq'] for i in range(3)]
+    assert seqs == [1, 2, 3], seqs
+
+    def eventos(desde):
+        return h.chamar('GET', f'/auction/{auction_id}/events?desde={desde}', rota='GET /auction/<id>/events').json
+
+    resp = eventos(1)
+    assert not resp['resync'] and [(e['seq'], e['valor']) for e in resp['eventos']] == [(2, 12.0), (3, 13.0)], resp
+    assert eventos(3) == {"seq_atual": 3, "resync": False, "eventos": []}
+    assert eventos(99)['resync'], "cursor do futuro não pediu resync"
+    assert h.chamar('GET', f'/auction/{auction_id}/events?desde=x', rota='GET /auction/<id>/events').status_code == 400
+
+    # Log cortado além do cursor do cliente: só resincronizando
+    maximo, replay.REPLAY_MAX = replay.REPLAY_MAX, 2
+    try:
+        h.lance(licitante, auction_id, 20)
+        assert eventos(1)['resync'], "eventos cortados do log sem pedir resync"
+        assert [e['seq'] for e in eventos(2)['eventos']] == [3, 4]
+    finally:
+        replay.REPLAY_MAX = maximo
+
+    # Worker conectado: sincroniza o cursor; depois perde um fechamento ao vivo
+    ai_worker.recuperar_eventos()
+    h.expirar(auction_id)
+    h.chamar('GET', '/auction/status')
+    h.pubsub.get_message(ignore_subscribe_messages=True, timeout=0.5)  # mensagem "perdida"
+
+    fechamento = eventos(4)['eventos']
+    assert [(e['tipo'], e['status']) for e in fechamento] == [('encerrado', 'ENCERRADO')], fechamento
+
+    ai_worker.ultimo_canal_seq = None  # worker reiniciado: volta do cursor salvo no Redis
+    ai_worker.recuperar_eventos()
+    assert len(h.webhook.recebidos) == 1, "fechamento perdido não foi recuperado"
+    ai_worker.recuperar_eventos()
+    assert len(h.webhook.recebidos) == 1, "fechamento reprocessado"
+    assert len(h.notificacoes(licitante)) == 1
+
+def cenario_carga(h, num_leiloes, iteracoes):
+    """Popula `num_leiloes` leilões e mede as rotas quentes."""
+    seed.seed_auctions(num_leiloes)
+    ids = list(h.r.smembers('active_auctions'))
+    licitante = h.registrar("Licitante Carga")
+    palavras = ["laptop", "camera", "monitor", "drone", "cafe"]
+
+    for _ in range(iteracoes):
+        auction_id = random.choice(ids)
+        lance_atual = float(h.r.hget(f'auction:{auction_id}', 'lance_atual'))
+        resp = h.lance(licitante, auction_id, round(lance_atual + 1, 2))
+        assert resp.status_code in (200, 400), resp.json
+
+        h.chamar('GET', f'/auction/search?q={random.choice(palavras)}&preco_max=5000&ordenar=preco')
+        h.chamar('GET', f'/auction/ranking?tipo={random.choice(["velocidade", "lances", "encerrando"])}',
+                 rota='GET /auction/ranking')
+        h.notificacoes(licitante)
+
+    for _ in range(3):
+        assert len(h.chamar('GET', '/auction/status').json) == num_leiloes
+
+    # Deploy sobre dados antigos: o seed job reconstrói os índices sem bagunçar a ordem existente
+    def ids(resp):
+        return [l['id'] for l in resp.json['resultados']]
+
+    busca = ids(h.chamar('GET', '/auction/search?q=camera&por_pagina=100'))
+    topo = ids(h.chamar('GET', '/auction/ranking?tipo=lances', rota='GET /auction/ranking'))
+    ordem = ids(h.chamar('GET', f'/user/{licitante}/bids?por_pagina=100', rota='GET /user/<id>/bids'))
+    h.r.delete(*h.r.keys('idx:*'), ranking.TOTAL_KEY)
+    assert h.chamar('GET', '/auction/search?q=camera').json['total'] == 0
+    for _ in range(2):
+        seed.rebuild_indexes()
+    assert ids(h.chamar('GET', '/auction/search?q=camera&por_pagina=100')) == busca, "rebuild não restaurou a busca"
+    assert ids(h.chamar('GET', '/auction/ranking?tipo=lances', rota='GET /auction/ranking')) == topo
+    assert ids(h.chamar('GET', f'/user/{licitante}/bids?por_pagina=100', rota='GET /user/<id>/bids')) == ordem, \
+        "rebuild mudou a ordem do índice do usuário"
+
+def cenario_busca_escala(h, num_leiloes, iteracoes):
+    """Indexa `num_leiloes` leilões (só os índices de busca) e mede a busca no Redis, sem o Flask."""
+    # Vocabulário de 200 palavras, 3 por título: cada termo cobre ~1,5% dos leilões
+    palavras = [f"{base}{n}" for base in ("laptop", "camera", "monitor", "drone", "cafe",
+                                          "mesa", "bicicleta", "relogio", "guitarra", "livro")
+                for n in ("", "pro", "mini", "max", "plus", "x", "s", "neo", "air", "ultra",
+                          "lite", "go", "one", "duo", "flex", "hd", "zen", "nova", "prime", "turbo")]
+    termino = datetime.datetime.now() + datetime.timedelta(days=1)
+    pipe = h.r.pipeline(transaction=False)
+    for auction_id in range(1, num_leiloes + 1):
+        titulo = ' '.join(random.sample(palavras, 3))
+        horario = (termino + datetime.timedelta(seconds=random.randint(0, 86400))).strftime('%Y-%m-%d %H:%M:%S')
+        search_index.index_auction(pipe, auction_id, titulo, random.uniform(10, 5000), horario)
+        if auction_id % 5000 == 0:
+            pipe.execute()
+    pipe.execute()
+
+    consultas = [
+        dict(q='camera', preco_max=4000),
+        dict(q='dronepro guitarra', preco_min=100, preco_max=2000, ordenar='preco'),
+        dict(q='cafemax', ordenar='preco', decrescente=True),
+        dict(preco_max=4500),
+        dict(preco_min=4900),
+        dict(preco_min=100, preco_max=3000, ordenar='preco', decrescente=True, offset=40),
+        dict(),
+    ]
+    amostras = h.latencias.setdefault("busca em escala (Redis)", [])
+    for _ in range(min(iteracoes, 20)):
+        for consulta in consultas:
+            inicio = time.perf_counter()
+            total, ids = search_index.search(h.r, **consulta)
+            amostras.append(time.perf_counter() - inicio)
+            assert len(ids) <= 20 and (ids or total <= consulta.get('offset', 0)), (consulta, total)
+
+    assert not list(h.r.scan_iter(match='idx:tmp:*')), "busca deixou chaves temporárias"
+    preco = h.r.zcount(search_index.PRICE_INDEX, '-inf', 4500)
+    assert search_index.search(h.r, preco_max=4500)[0] == preco
+
+# --- SERVIÇO DE PRODUÇÃO (gunicorn) ---
+
+# Mistura de rotas de leitura usada para medir req/s
+ROTAS_SERVICO = [
+    '/auction/search?q=camera',
+    '/auction/search?preco_max=500&ordenar=preco',
+    '/auction/1/bids',
+    '/user/1/auctions',
+]
+
+def medir_servico(workers, duracao, num_leiloes):
+    """Sobe o gunicorn como em produção e mede o cold start e as req/s por core."""
+    cliente, descricao, porta_redis, parar = iniciar_redis(tcp=True)
+    seed.configure_redis(cliente)
+    seed.seed_auctions(num_leiloes)
+
+    porta_api = _porta_livre()
+    url = f"http://127.0.0.1:{porta_api}"
+    env = dict(os.environ, REDIS_HOST='127.0.0.1', REDIS_PORT=str(porta_redis),
+               WEB_CONCURRENCY=str(workers), GUNICORN_BIND=f"127.0.0.1:{porta_api}")
+
+    inicio = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'app:app'],
+        cwd=os.path.dirname(os.path.abspath(__file__)), env=env,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        # 1. Cold start: do exec até o primeiro /healthz/ready com sucesso
+        while True:
+            try:
+                if requests.get(f"{url}/healthz/ready", timeout=1).status_code == 200:
+                    break
+            except requests.exceptions.ConnectionError:
+                pass
+            if proc.poll() is not None or time.perf_counter() - inicio > 30:
+                sys.exit("ERRO: o gunicorn não ficou pronto em 30s.")
+            time.sleep(0.01)
+        cold_start = time.perf_counter() - inicio
+
+        # 2. Carga: clientes em threads, cada um com a própria sessão keep-alive
+        contagem = {"ok": 0, "erros": 0}
+        lock = threading.Lock()
+        fim = time.perf_counter() + duracao
+
+        def gerar_carga():
+            sessao = requests.Session()
+            ok = erros = 0
+            while time.perf_counter() < fim:
+                resp = sessao.get(url + random.choice(ROTAS_SERVICO))
+                if resp.status_code == 200:
+                    ok += 1
+                else:
+                    erros += 1
+            with lock:
+                contagem["ok"] += ok
+                contagem["erros"] += erros
+
+        clientes = [threading.Thread(target=gerar_carga) for _ in range(workers * 4)]
+        for t in clientes:
+            t.start()
+        for t in clientes:
+            t.join()
+    finally:
+        proc.terminate()
+        proc.wait()
+        parar()
+
+    req_s = contagem["ok"] / duracao
+    cores = min(workers, os.cpu_count() or 1)
+    print("\n" + "="*60)
+    print(f"Backend: {descricao} | {workers} workers gunicorn | {cores} core(s)")
+    print(f"Cold start (exec -> /healthz/ready): {cold_start * 1000:.0f} ms")
+    print(f"Throughput: {req_s:.1f} req/s ({req_s / cores:.1f} req/s por core) | Erros: {contagem['erros']}")
+    print("Obs.: o gerador de carga roda na mesma máquina e disputa CPU com a API.")
+    print("="*60)
+
+# --- EXECUÇÃO ---
+
+def _p95_ms(amostras):
+    amostras = sorted(amostras)
+    return amostras[int(len(amostras) * 0.95)] * 1000
+
+def main():
+    parser = argparse.ArgumentParser(description="Harness de correção e desempenho (Redis descartável)")
+    parser.add_argument('--leiloes', type=int, default=2000, help="Leilões ativos no cenário de carga")
+    parser.add_argument('--iteracoes', type=int, default=200, help="Repetições por rota no cenário de carga")
+    parser.add_argument('--leiloes-busca', type=int, default=100000, help="Leilões indexados no cenário de busca em escala (0 pula)")
+    parser.add_argument('--sem-orcamento', action='store_true', help="Só reporta latências, sem reprovar")
+    parser.add_argument('--servico', action='store_true', help="Mede cold start e req/s do gunicorn de produção")
+    parser.add_argument('--workers', type=int, default=2, help="Workers do gunicorn no modo --servico")
+    parser.add_argument('--duracao', type=int, default=10, help="Segundos de carga no modo --servico")
+    args = parser.parse_args()
+
+    if args.servico:
+        medir_servico(args.workers, args.duracao, args.leiloes)
+        return
+
+    cliente, descricao, _, parar = iniciar_redis()
+    webhook = iniciar_webhook()
+    pasta = tempfile.mkdtemp(prefix='harness-')
+    archiver.ARCHIVE_PATH = os.path.join(pasta, 'leiloes.db')
+    verifica_orcamento = not args.sem_orcamento and not descricao.startswith('fakeredis')
+
+    print(f"Harness usando {descricao}. Arquivo frio em {pasta}.", flush=True)
+    h = Harness(cliente, webhook)
+    cenarios = [
+        ("ciclo completo", lambda: cenario_ciclo_completo(h)),
+        ("leilão cancelado", lambda: cenario_cancelado(h)),
+        ("replay de eventos", lambda: cenario_replay(h)),
+        ("carga", lambda: cenario_carga(h, args.leiloes, args.iteracoes)),
+    ]
+    if args.leiloes_busca:
+        cenarios.append(("busca em escala", lambda: cenario_busca_escala(h, args.leiloes_busca, args.iteracoes)))
+
+    falhas = 0
+    try:
+        for nome, cenario in cenarios:
+            h.reset()
+            inicio = time.perf_counter()
+            try:
+                cenario()
+                print(f"✅ {nome} ({time.perf_counter() - inicio:.2f}s)", flush=True)
+            except AssertionError:
+                falhas += 1
+                print(f"❌ {nome}:\n{traceback.format_exc()}", flush=True)
+    finally:
+        webhook.shutdown()
+        parar()
+        shutil.rmtree(pasta, ignore_errors=True)
+
+    print("\n" + "="*60)
+    print(f"{'ROTA':<36}{'N':>6}{'p95 (ms)':>10}{'LIMITE':>8}")
+    for rota, amostras in sorted(h.latencias.items()):
+        limite = ORCAMENTOS_MS.get(rota)
+        p95 = _p95_ms(amostras)
+        marca = ''
+        if limite and verifica_orcamento and p95 > limite:
+            falhas += 1
+            marca = ' ❌'
+        print(f"{rota:<36}{len(amostras):>6}{p95:>10.2f}{limite or '-':>8}{marca}")
+    print("="*60)
+    if not verifica_orcamento:
+        print("Orçamentos de latência não verificados (fakeredis ou --sem-orcamento).")
+
+    sys.exit(1 if falhas else 0)
+
+if __name__ == '__main__':
+    main()
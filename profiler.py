@@ -0,0 +1,363 @@
+import redis
+import collections
+import contextlib
+import threading
+import functools
+import logging.handlers
+import json
+import time
+import socket
+import sys
+import os
+
+from flask import request, jsonify, Response
+
+# --- CONFIGURAÇÃO ---
+
+# Liga o profiler já na inicialização (também pode ser ligado em /admin/profiler)
+PROFILE_ENABLED = os.environ.get('PROFILE_ENABLED', '0') == '1'
+PROFILE_SAMPLE_INTERVAL_MS = float(os.environ.get('PROFILE_SAMPLE_INTERVAL_MS', 10))
+PROFILE_SLOW_MS = float(os.environ.get('PROFILE_SLOW_MS', 200))
+PROFILE_SLOW_LOG = os.environ.get('PROFILE_SLOW_LOG', '/tmp/slow_requests.log')
+# O log de lentos gira ao atingir esse tamanho, guardando PROFILE_SLOW_LOG_BACKUPS arquivos antigos
+PROFILE_SLOW_LOG_MAX_BYTES = int(os.environ.get('PROFILE_SLOW_LOG_MAX_BYTES', 10 * 1024 * 1024))
+PROFILE_SLOW_LOG_BACKUPS = int(os.environ.get('PROFILE_SLOW_LOG_BACKUPS', 3))
+
+# Comandos que ficam parados no servidor esperando dados (long-poll): esse tempo
+# é espera ociosa, não lentidão, e não conta para o limite de requisição lenta
+COMANDOS_BLOQUEANTES = {'BLMPOP', 'BLPOP', 'BRPOP', 'BLMOVE', 'BZPOPMIN', 'BZPOPMAX', 'BZMPOP', 'XREAD'}
+
+# Se definido, o amostrador grava as pilhas (formato "collapsed") em "<caminho>.<pid>" periodicamente
+PROFILE_FLAMEGRAPH_PATH = os.environ.get('PROFILE_FLAMEGRAPH_PATH')
+PROFILE_DUMP_SECONDS = int(os.environ.get('PROFILE_DUMP_SECONDS', 60))
+
+# Endpoints /admin/* exigem o header X-Admin-Token; sem token configurado ficam desligados
+ADMIN_TOKEN = os.environ.get('ADMIN_TOKEN')
+
+# Com vários processos (workers do gunicorn, pods), o controle e as pilhas passam pelo Redis:
+# o POST em /admin/profiler grava em CONTROL_KEY e cada processo aplica na próxima leitura;
+# cada processo publica as suas pilhas em STACKS_PREFIX<host>:<pid> para o flamegraph agregado.
+# O estado gravado no Redis prevalece sobre PROFILE_ENABLED.
+CONTROL_KEY = 'profiler:controle'
+STACKS_PREFIX = 'profiler:pilhas:'
+PROFILE_SYNC_SECONDS = float(os.environ.get('PROFILE_SYNC_SECONDS', 2))
+STACKS_TTL_SECONDS = 3600
+# Só as pilhas mais frequentes de cada processo vão para o Redis
+PROFILE_MAX_PILHAS = int(os.environ.get('PROFILE_MAX_PILHAS', 300))
+
+MAX_STACK_DEPTH = 64
+
+# --- ESTADO ---
+
+_ativo = False
+_amostras = collections.Counter()
+_lock = threading.Lock()
+_contexto = threading.local()
+_amostrador = None
+# Threads em uma requisição/track() -> True, ou False enquanto paradas num comando bloqueante.
+# Só essas são amostradas: threads ociosas do gunicorn e long-polls não entram nas pilhas.
+_trabalhando = {}
+_redis = None
+_observador = None
+_limpeza = None      # último pedido de limpeza aplicado (contador em CONTROL_KEY)
+_publicado = None    # total de amostras na última publicação no Redis
+_log_lento = None
+
+# --- AMOSTRAGEM DE PILHAS ---
+
+def _pilha(frame):
+    """
+    Pilha da raiz até a folha no formato "funcao (arquivo)"; só a folha leva a linha,
+    para que o mesmo caminho de chamadas não vire várias pilhas diferentes.
+    """
+    codigo = frame.f_code
+    quadros = [f"{codigo.co_name} ({os.path.basename(codigo.co_filename)}:{frame.f_lineno})"]
+    frame = frame.f_back
+    while frame is not None and len(quadros) < MAX_STACK_DEPTH:
+        codigo = frame.f_code
+        quadros.append(f"{codigo.co_name} ({os.path.basename(codigo.co_filename)})")
+        frame = frame.f_back
+    return ';'.join(reversed(quadros))
+
+def _amostrar():
+    """Thread do amostrador: a cada intervalo, lê as pilhas das threads que estão trabalhando."""
+    intervalo = PROFILE_SAMPLE_INTERVAL_MS / 1000
+    proximo_dump = time.monotonic() + PROFILE_DUMP_SECONDS
+
+    while _ativo:
+        frames = sys._current_frames()
+        pilhas = [_pilha(frames[tid]) for tid, ocupada in list(_trabalhando.items())
+                  if ocupada and tid in frames]
+        with _lock:
+            _amostras.update(pilhas)
+
+        if PROFILE_FLAMEGRAPH_PATH and time.monotonic() >= proximo_dump:
+            dump_flamegraph(f"{PROFILE_FLAMEGRAPH_PATH}.{os.getpid()}")
+            proximo_dump = time.monotonic() + PROFILE_DUMP_SECONDS
+        time.sleep(intervalo)
+
+def start():
+    """Liga a amostragem e a medição de comandos Redis."""
+    global _ativo, _amostrador
+    _instrument_redis()
+    _ativo = True
+    if _amostrador is not None and _amostrador.is_alive():
+        return
+    _amostrador = threading.Thread(target=_amostrar, name='profiler', daemon=True)
+    _amostrador.start()
+    print(f"🔬 Profiler ligado (amostra a cada {PROFILE_SAMPLE_INTERVAL_MS} ms, lento > {PROFILE_SLOW_MS} ms).", flush=True)
+
+def stop():
+    global _ativo
+    _ativo = False
+
+def reset():
+    with _lock:
+        _amostras.clear()
+
+def flamegraph(limite=None):
+    """Pilhas acumuladas no formato "collapsed" (flamegraph.pl, speedscope, inferno)."""
+    with _lock:
+        return ''.join(f"{pilha} {total}\n" for pilha, total in _amostras.most_common(limite))
+
+def dump_flamegraph(path):
+    with open(path, 'w') as f:
+        f.write(flamegraph())
+
+# --- CONTROLE ENTRE PROCESSOS (REDIS) ---
+
+def _minha_chave():
+    return f"{STACKS_PREFIX}{socket.gethostname()}:{os.getpid()}"
+
+def _aplicar(controle):
+    """Aplica neste processo o estado gravado em CONTROL_KEY."""
+    global PROFILE_SLOW_MS, _limpeza
+    if 'limite_lento_ms' in controle:
+        PROFILE_SLOW_MS = float(controle['limite_lento_ms'])
+    if controle.get('limpar') != _limpeza:
+        _limpeza = controle.get('limpar')
+        reset()
+    if controle.get('ativo') == '1' and not _ativo:
+        start()
+    elif controle.get('ativo') == '0' and _ativo:
+        stop()
+
+def _publicar_pilhas():
+    """Publica as pilhas deste processo no Redis quando mudaram desde a última vez."""
+    global _publicado
+    with _lock:
+        total = sum(_amostras.values())
+    if total == _publicado:
+        return
+    if total:
+        _redis.set(_minha_chave(), flamegraph(PROFILE_MAX_PILHAS), ex=STACKS_TTL_SECONDS)
+    else:
+        _redis.delete(_minha_chave())
+    _publicado = total
+
+def _observar():
+    while True:
+        try:
+            _aplicar(_redis.hgetall(CONTROL_KEY))
+            _publicar_pilhas()
+        except redis.exceptions.RedisError as e:
+            print(f"AVISO: profiler sem acesso ao Redis: {e}", flush=True)
+        time.sleep(PROFILE_SYNC_SECONDS)
+
+def watch(r):
+    """
+    Liga o controle compartilhado neste processo. Chamar depois do fork
+    (post_fork do gunicorn), já com o cliente Redis do processo.
+    """
+    global _redis, _observador
+    _redis = r
+    if _observador is not None and _observador.is_alive():
+        return
+    _observador = threading.Thread(target=_observar, name='profiler-controle', daemon=True)
+    _observador.start()
+
+def _amostras_agregadas():
+    """Pilhas de todos os processos: as publicadas no Redis mais as locais (mais recentes)."""
+    with _lock:
+        total = collections.Counter(_amostras)
+    if _redis is None:
+        return total
+
+    propria = _minha_chave()
+    for chave in _redis.scan_iter(match=f'{STACKS_PREFIX}*', count=100):
+        if chave == propria:
+            continue
+        for linha in (_redis.get(chave) or '').splitlines():
+            pilha, _, quantidade = linha.rpartition(' ')
+            if pilha:
+                total[pilha] += int(quantidade)
+    return total
+
+# --- COMANDOS REDIS POR REQUISIÇÃO ---
+
+def _registrar(nome, inicio):
+    comandos = getattr(_contexto, 'comandos', None)
+    if comandos is not None:
+        comandos.append((nome, round((time.perf_counter() - inicio) * 1000, 3)))
+
+def _instrument_redis():
+    """Envolve execute_command/Pipeline.execute uma única vez; desligado, custa um if."""
+    if getattr(redis.Redis.execute_command, '_profiler', False):
+        return
+
+    original_cmd = redis.Redis.execute_command
+    original_pipe = redis.client.Pipeline.execute
+
+    @functools.wraps(original_cmd)
+    def execute_command(self, *args, **options):
+        if not _ativo:
+            return original_cmd(self, *args, **options)
+        nome = str(args[0])
+        tid = threading.get_ident()
+        # Enquanto espera num comando bloqueante, a thread sai da amostragem
+        bloqueante = nome.upper() in COMANDOS_BLOQUEANTES and tid in _trabalhando
+        if bloqueante:
+            _trabalhando[tid] = False
+        inicio = time.perf_counter()
+        try:
+            return original_cmd(self, *args, **options)
+        finally:
+            if bloqueante:
+                _trabalhando[tid] = True
+            _registrar(nome, inicio)
+
+    @functools.wraps(original_pipe)
+    def execute(self, *args, **kwargs):
+        if not _ativo:
+            return original_pipe(self, *args, **kwargs)
+        nome = f"PIPELINE[{len(self.command_stack)}]"
+        inicio = time.perf_counter()
+        try:
+            return original_pipe(self, *args, **kwargs)
+        finally:
+            _registrar(nome, inicio)
+
+    execute_command._profiler = True
+    redis.Redis.execute_command = execute_command
+    redis.client.Pipeline.execute = execute
+
+def _iniciar_contexto():
+    _contexto.inicio = time.perf_counter()
+    _contexto.comandos = [] if _ativo else None
+    if _ativo:
+        _trabalhando[threading.get_ident()] = True
+
+def _finalizar_contexto(nome, **extra):
+    """Fecha a medição atual e grava no log se passou do limite."""
+    comandos = getattr(_contexto, 'comandos', None)
+    _contexto.comandos = None
+    _trabalhando.pop(threading.get_ident(), None)
+    if comandos is None:
+        return
+
+    duracao_ms = (time.perf_counter() - _contexto.inicio) * 1000
+    espera_ms = sum(ms for nome_cmd, ms in comandos if nome_cmd.upper() in COMANDOS_BLOQUEANTES)
+    if duracao_ms - espera_ms < PROFILE_SLOW_MS:
+        return
+
+    registro = {
+        "ts": time.strftime('%Y-%m-%d %H:%M:%S'),
+        "nome": nome,
+        "ms": round(duracao_ms, 2),
+        "espera_ms": round(espera_ms, 2),
+        "redis_ms": round(sum(ms for _, ms in comandos), 2),
+        "redis_comandos": len(comandos),
+        "comandos": comandos,
+        **extra
+    }
+    _logger_lento().info(json.dumps(registro, ensure_ascii=False))
+
+def _logger_lento():
+    """Logger do arquivo de lentos, com rotação por tamanho (criado no primeiro uso)."""
+    global _log_lento
+    with _lock:
+        if _log_lento is None:
+            handler = logging.handlers.RotatingFileHandler(
+                PROFILE_SLOW_LOG, maxBytes=PROFILE_SLOW_LOG_MAX_BYTES, backupCount=PROFILE_SLOW_LOG_BACKUPS
+            )
+            handler.setFormatter(logging.Formatter('%(message)s'))
+            _log_lento = logging.getLogger('profiler.lentos')
+            _log_lento.setLevel(logging.INFO)
+            _log_lento.propagate = False
+            _log_lento.addHandler(handler)
+    return _log_lento
+
+@contextlib.contextmanager
+def track(nome):
+    """Mede um trecho fora do Flask (ex.: um evento do worker)."""
+    _iniciar_contexto()
+    try:
+        yield
+    finally:
+        _finalizar_contexto(nome)
+
+# --- INTEGRAÇÃO COM O FLASK ---
+
+def _admin_autorizado():
+    return ADMIN_TOKEN and request.headers.get('X-Admin-Token') == ADMIN_TOKEN
+
+def admin_status():
+    """GET: estado do profiler. POST {"ativo": bool, "limite_lento_ms": n, "limpar": bool}: altera."""
+    global PROFILE_SLOW_MS
+    if not _admin_autorizado():
+        return jsonify({"erro": "Não autorizado."}), 403
+
+    if request.method == 'POST':
+        data = request.json or {}
+        if _redis is not None:
+            # Grava para os demais processos; este aplica na hora, logo abaixo
+            pipe = _redis.pipeline()
+            if data.get('limpar'):
+                pipe.hincrby(CONTROL_KEY, 'limpar', 1)
+            if 'limite_lento_ms' in data:
+                pipe.hset(CONTROL_KEY, 'limite_lento_ms', float(data['limite_lento_ms']))
+            if data.get('ativo') in (True, False):
+                pipe.hset(CONTROL_KEY, 'ativo', '1' if data['ativo'] else '0')
+            pipe.execute()
+
+        if data.get('limpar'):
+            reset()
+        if 'limite_lento_ms' in data:
+            PROFILE_SLOW_MS = float(data['limite_lento_ms'])
+        if data.get('ativo') is True:
+            start()
+        elif data.get('ativo') is False:
+            stop()
+
+    return jsonify({
+        "ativo": _ativo,
+        "amostras": sum(_amostras_agregadas().values()),
+        "intervalo_ms": PROFILE_SAMPLE_INTERVAL_MS,
+        "limite_lento_ms": PROFILE_SLOW_MS,
+        "log_lento": PROFILE_SLOW_LOG
+    }), 200
+
+def admin_flamegraph():
+    """Pilhas amostradas (de todos os processos) em texto "collapsed", pronto para gerar o flamegraph."""
+    if not _admin_autorizado():
+        return jsonify({"erro": "Não autorizado."}), 403
+    agregado = _amostras_agregadas()
+    return Response(''.join(f"{pilha} {total}\n" for pilha, total in agregado.most_common()), mimetype='text/plain')
+
+def init_app(app):
+    """
+    Registra os hooks por requisição e os endpoints /admin/profiler.
+    Não liga o amostrador: com preload_app isso rodaria no master do gunicorn;
+    quem liga é cada processo (post_fork / __main__), via start() e watch().
+    """
+    @app.before_request
+    def _antes():
+        _iniciar_contexto()
+
+    @app.after_request
+    def _depois(response):
+        _finalizar_contexto(f"{request.method} {request.path}", status=response.status_code)
+        return response
+
+    app.add_url_rule('/admin/profiler', 'admin_profiler', admin_status, methods=['GET', 'POST'])
+    app.add_url_rule('/admin/profiler/flamegraph', 'admin_flamegraph', admin_flamegraph, methods=['GET'])
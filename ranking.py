@@ -0,0 +1,136 @@
+import redis
+import time
+import os
+
+import search_index
+
+# --- CONFIGURAÇÃO ---
+
+# Tenta ler do ambiente K8s, fallback para redis-service
+REDIS_HOST = os.environ.get('REDIS_HOST', 'redis-service')
+REDIS_PORT = int(os.environ.get('REDIS_PORT', 6379))
+
+# Janela da "velocidade de lances" (lances nos últimos N minutos)
+VELOCITY_WINDOW_MINUTES = int(os.environ.get('VELOCITY_WINDOW_MINUTES', 5))
+# Por quanto tempo o ranking agregado de velocidade é reaproveitado entre chamadas
+VELOCITY_CACHE_SECONDS = int(os.environ.get('VELOCITY_CACHE_SECONDS', 2))
+
+# Total de lances por leilão ativo. Só contém leilões ativos: a entrada nasce na
+# criação e o lance só incrementa o que já existe (XX), então um lance que corre
+# com o fechamento não recria o leilão já removido.
+TOTAL_KEY = 'rank:lances'
+# Um Sorted Set por minuto (rank:velocidade:{epoch // 60}); expiram sozinhos
+VELOCITY_PREFIX = 'rank:velocidade:'
+VELOCITY_CACHE_KEY = 'rank:velocidade:agregado'
+
+TIPOS = ('velocidade', 'lances', 'encerrando')
+
+def _minuto(ts):
+    return int(ts // 60)
+
+def _buckets(ts):
+    """Chaves dos minutos dentro da janela, do atual para trás."""
+    atual = _minuto(ts)
+    return [f'{VELOCITY_PREFIX}{m}' for m in range(atual, atual - VELOCITY_WINDOW_MINUTES, -1)]
+
+# --- MANUTENÇÃO (recebem um pipeline para entrar na mesma ida ao Redis) ---
+
+def add_auction(pipe, auction_id):
+    """Coloca um leilão recém-criado no ranking de total de lances."""
+    pipe.zadd(TOTAL_KEY, {auction_id: 0}, nx=True)
+
+def record_bid(pipe, auction_id, ts=None, quantidade=1):
+    """Conta lance(s) no total e no balde do minuto atual."""
+    ts = ts or time.time()
+    bucket = f'{VELOCITY_PREFIX}{_minuto(ts)}'
+    # XX: não recria leilão que fechou entre a leitura e este pipeline
+    pipe.zadd(TOTAL_KEY, {auction_id: quantidade}, xx=True, incr=True)
+    # Os baldes não têm como usar XX (cada minuto é uma chave nova); a agregação
+    # em top() descarta quem não está mais em TOTAL_KEY
+    pipe.zincrby(bucket, quantidade, auction_id)
+    # O balde só precisa viver enquanto estiver dentro da janela
+    pipe.expire(bucket, (VELOCITY_WINDOW_MINUTES + 1) * 60)
+
+def remove_auction(pipe, auction_id, ts=None):
+    """Tira um leilão fechado de todos os rankings."""
+    pipe.zrem(TOTAL_KEY, auction_id)
+    for bucket in _buckets(ts or time.time()):
+        pipe.zrem(bucket, auction_id)
+
+# --- CONSULTA ---
+
+def _ativos(r, candidatos):
+    """Filtra [(id, score)] mantendo só os leilões ainda em 'active_auctions'."""
+    if not candidatos:
+        return []
+    ativos = r.smismember('active_auctions', [auction_id for auction_id, _ in candidatos])
+    return [c for c, ativo in zip(candidatos, ativos) if ativo]
+
+def _completar(r, buscar, k):
+    """
+    Lê o ranking em páginas de k até ter k leilões ativos (ou acabar a lista),
+    para que uma entrada velha não roube uma vaga do top-K.
+    """
+    resultado = []
+    inicio = 0
+    while len(resultado) < k:
+        pagina = buscar(inicio, k)
+        resultado.extend(_ativos(r, pagina))
+        if len(pagina) < k:
+            break
+        inicio += k
+    return resultado[:k]
+
+def top(r, tipo, k=10):
+    """
+    Top-K de um ranking. Retorna [(id, score)]:
+    - velocidade: lances/minuto na janela (soma dos baldes, decaimento por expiração)
+    - lances: total de lances
+    - encerrando: segundos até o término, menor primeiro
+    """
+    agora = time.time()
+
+    if tipo == 'lances':
+        return _completar(r, lambda inicio, n: r.zrevrange(TOTAL_KEY, inicio, inicio + n - 1, withscores=True), k)
+
+    if tipo == 'encerrando':
+        ids = _completar(r, lambda inicio, n: r.zrangebyscore(
+            search_index.END_INDEX, agora, '+inf', start=inicio, num=n, withscores=True), k)
+        return [(auction_id, termino - agora) for auction_id, termino in ids]
+
+    # Velocidade: agrega só os baldes da janela e reaproveita o resultado por alguns segundos.
+    # A interseção com TOTAL_KEY (peso 0) descarta leilões já fechados que sobraram nos baldes.
+    if not r.exists(VELOCITY_CACHE_KEY):
+        pipe = r.pipeline()
+        pipe.zunionstore(VELOCITY_CACHE_KEY, _buckets(agora))
+        pipe.zinterstore(VELOCITY_CACHE_KEY, {VELOCITY_CACHE_KEY: 1, TOTAL_KEY: 0})
+        pipe.expire(VELOCITY_CACHE_KEY, VELOCITY_CACHE_SECONDS)
+        pipe.execute()
+    ids = _completar(r, lambda inicio, n: r.zrevrange(VELOCITY_CACHE_KEY, inicio, inicio + n - 1, withscores=True), k)
+    return [(auction_id, total / VELOCITY_WINDOW_MINUTES) for auction_id, total in ids]
+
+# --- MANUTENÇÃO ---
+
+def rebuild(r):
+    """
+    Recoloca em TOTAL_KEY os leilões ativos que não estão lá (criados antes de
+    add_auction existir) e tira os que já fecharam.
+    """
+    ativos = r.smembers('active_auctions')
+    pipe = r.pipeline(transaction=False)
+    for auction_id in ativos:
+        pipe.zcard(f'bids:{auction_id}')
+    totais = pipe.execute()
+
+    pipe = r.pipeline(transaction=False)
+    for auction_id, total in zip(ativos, totais):
+        pipe.zadd(TOTAL_KEY, {auction_id: total}, nx=True)
+    for auction_id in r.zrange(TOTAL_KEY, 0, -1):
+        if auction_id not in ativos:
+            pipe.zrem(TOTAL_KEY, auction_id)
+    pipe.execute()
+    return len(ativos)
+
+if __name__ == '__main__':
+    r = redis.StrictRedis(host=REDIS_HOST, port=REDIS_PORT, decode_responses=True)
+    print(f"Ranking reconstruído: {rebuild(r)} leilões ativos.", flush=True)
@@ -0,0 +1,82 @@
+import json
+import os
+
+# --- CONFIGURAÇÃO ---
+
+# Eventos guardados por leilão e no canal global de fechamentos
+REPLAY_MAX = int(os.environ.get('REPLAY_MAX', 200))
+REPLAY_CANAL_MAX = int(os.environ.get('REPLAY_CANAL_MAX', 1000))
+
+CANAL_EVENTOS = 'leiloes_finalizados'
+
+# Publica com número de sequência, grava no log e corta o excesso, tudo atômico.
+# O JSON do evento chega pronto (objeto não vazio); o script só insere o campo de sequência.
+PUBLICAR_LUA = """
+local seq = redis.call('INCR', KEYS[1])
+local evento = '{"' .. ARGV[4] .. '": ' .. seq .. ', ' .. string.sub(ARGV[2], 2)
+redis.call('ZADD', KEYS[2], seq, evento)
+redis.call('ZREMRANGEBYRANK', KEYS[2], 0, -(tonumber(ARGV[3]) + 1))
+redis.call('PUBLISH', ARGV[1], evento)
+return seq
+"""
+
+_script = None
+
+def _seq_key(nome):
+    return f'seq:{nome}'
+
+def _log_key(nome):
+    return f'replay:{nome}'
+
+def _publicar(r, nome, canal, evento, maximo, campo):
+    global _script
+    if _script is None:
+        _script = r.register_script(PUBLICAR_LUA)
+    return _script(keys=[_seq_key(nome), _log_key(nome)],
+                   args=[canal, json.dumps(evento), maximo, campo], client=r)
+
+# --- PUBLICAÇÃO ---
+
+def publish_bid(r, auction_id, bid_data):
+    """Publica um lance em bid_updates:ID com a sequência do leilão. Retorna a sequência."""
+    return _publicar(r, auction_id, f'bid_updates:{auction_id}',
+                     {"tipo": "lance", **bid_data}, REPLAY_MAX, 'seq')
+
+def publish_close(r, auction_id, status):
+    """
+    Publica o fechamento no canal do leilão (para quem acompanha os lances) e
+    no canal global de fechamentos, que tem a sua própria sequência (canal_seq).
+    """
+    seq = _publicar(r, auction_id, f'bid_updates:{auction_id}',
+                    {"tipo": "encerrado", "auction_id": auction_id, "status": status}, REPLAY_MAX, 'seq')
+    _publicar(r, CANAL_EVENTOS, CANAL_EVENTOS,
+              {"auction_id": auction_id, "status": status, "seq": seq}, REPLAY_CANAL_MAX, 'canal_seq')
+    return seq
+
+# --- REPLAY ---
+
+def _since(r, nome, desde):
+    pipe = r.pipeline(transaction=True)
+    pipe.get(_seq_key(nome))
+    pipe.zrange(_log_key(nome), 0, 0, withscores=True)
+    pipe.zrangebyscore(_log_key(nome), f'({desde}', '+inf')
+    atual, mais_antigo, eventos = pipe.execute()
+
+    atual = int(atual or 0)
+    if desde == atual:
+        return atual, False, []
+    # Cursor do futuro (Redis recriado) ou eventos já cortados do log: só resincronizando
+    if desde > atual or not mais_antigo or mais_antigo[0][1] > desde + 1:
+        return atual, True, []
+    return atual, False, [json.loads(e) for e in eventos]
+
+def events_since(r, auction_id, desde):
+    """Eventos do leilão com seq > desde. Retorna (seq_atual, precisa_resync, eventos)."""
+    return _since(r, auction_id, desde)
+
+def channel_events_since(r, desde):
+    """Fechamentos do canal global com canal_seq > desde. Mesmo retorno de events_since."""
+    return _since(r, CANAL_EVENTOS, desde)
+
+def channel_seq(r):
+    return int(r.get(_seq_key(CANAL_EVENTOS)) or 0)
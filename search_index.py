@@ -0,0 +1,190 @@
+import redis
+import datetime
+import unicodedata
+import uuid
+import re
+import os
+
+# --- CONFIGURAÇÃO ---
+
+# Tenta ler do ambiente K8s, fallback para redis-service
+REDIS_HOST = os.environ.get('REDIS_HOST', 'redis-service')
+REDIS_PORT = int(os.environ.get('REDIS_PORT', 6379))
+
+# Índice invertido: idx:titulo:{token} -> Set de IDs de leilões ativos
+TERM_PREFIX = 'idx:titulo:'
+# Sorted Sets de ordenação: lance atual e horário de término (epoch)
+PRICE_INDEX = 'idx:preco'
+END_INDEX = 'idx:termino'
+
+# Chaves temporárias da busca expiram sozinhas se algo der errado no meio
+TMP_TTL_SECONDS = 5
+# Itens lidos por ida ao Redis ao percorrer o índice de término filtrando por preço
+SCAN_PAGE = 500
+
+TOKEN_RE = re.compile(r'[a-z0-9]+')
+
+# --- FUNÇÕES AUXILIARES ---
+
+def tokenize(texto):
+    """Quebra um título em tokens minúsculos e sem acento ("Câmera" -> "camera")."""
+    texto = unicodedata.normalize('NFKD', texto or '')
+    texto = ''.join(c for c in texto if not unicodedata.combining(c)).lower()
+    return set(TOKEN_RE.findall(texto))
+
+def _epoch(horario_termino):
+    """Converte o horario_termino armazenado no Redis para epoch (segundos)."""
+    return datetime.datetime.strptime(horario_termino, '%Y-%m-%d %H:%M:%S').timestamp()
+
+# --- MANUTENÇÃO DO ÍNDICE (recebem um pipeline para entrar na mesma ida ao Redis) ---
+
+def index_auction(pipe, auction_id, titulo, lance_atual, horario_termino):
+    """Adiciona um leilão ativo aos índices de título, preço e término."""
+    for token in tokenize(titulo):
+        pipe.sadd(f'{TERM_PREFIX}{token}', auction_id)
+    pipe.zadd(PRICE_INDEX, {auction_id: float(lance_atual)})
+    pipe.zadd(END_INDEX, {auction_id: _epoch(horario_termino)})
+
+def update_price(pipe, auction_id, lance_atual):
+    """Atualiza o preço indexado após um novo lance."""
+    pipe.zadd(PRICE_INDEX, {auction_id: float(lance_atual)}, xx=True)
+
+def unindex_auction(pipe, auction_id, titulo=None):
+    """Remove um leilão (fechado ou inexistente) de todos os índices."""
+    for token in tokenize(titulo):
+        pipe.srem(f'{TERM_PREFIX}{token}', auction_id)
+    pipe.zrem(PRICE_INDEX, auction_id)
+    pipe.zrem(END_INDEX, auction_id)
+
+def rebuild(r):
+    """Reconstrói os índices a partir de 'active_auctions' (dados antigos ou corrompidos)."""
+    total = 0
+    pipe = r.pipeline(transaction=False)
+    for auction_id in r.sscan_iter('active_auctions', count=500):
+        leilao = r.hmget(f'auction:{auction_id}', 'titulo', 'lance_atual', 'horario_termino')
+        if None in leilao:
+            continue
+        index_auction(pipe, auction_id, *leilao)
+        total += 1
+        if total % 500 == 0:
+            pipe.execute()
+    pipe.execute()
+    return total
+
+# --- BUSCA ---
+
+def search(r, q='', preco_min=None, preco_max=None, ordenar='termino', decrescente=False, offset=0, limit=20):
+    """
+    Busca leilões ativos por palavras do título e faixa de preço.
+    Nunca copia uma faixa inteira do índice de preço: com palavras, intersecta
+    primeiro os conjuntos dos termos (pequenos) e filtra o resultado pelo preço;
+    sem palavras, pagina direto nos Sorted Sets. Retorna (total, [ids da página]).
+    """
+    tokens = tokenize(q)
+    filtra_preco = preco_min is not None or preco_max is not None
+    ordem = PRICE_INDEX if ordenar == 'preco' else END_INDEX
+
+    if tokens:
+        return _buscar_termos(r, tokens, preco_min, preco_max, ordenar, decrescente, offset, limit)
+
+    if not filtra_preco:
+        # Sem filtros: pagina direto no índice de ordenação
+        pipe = r.pipeline()
+        pipe.zcard(ordem)
+        pipe.zrange(ordem, offset, offset + limit - 1, desc=decrescente)
+        return tuple(pipe.execute())
+
+    minimo = '-inf' if preco_min is None else preco_min
+    maximo = '+inf' if preco_max is None else preco_max
+    if ordenar == 'preco':
+        # Faixa de preço ordenada por preço: a própria faixa já é a resposta
+        pipe = r.pipeline()
+        pipe.zcount(PRICE_INDEX, minimo, maximo)
+        if decrescente:
+            pipe.zrevrangebyscore(PRICE_INDEX, maximo, minimo, start=offset, num=limit)
+        else:
+            pipe.zrangebyscore(PRICE_INDEX, minimo, maximo, start=offset, num=limit)
+        return tuple(pipe.execute())
+
+    return _buscar_faixa_por_termino(r, minimo, maximo, decrescente, offset, limit)
+
+def _buscar_termos(r, tokens, preco_min, preco_max, ordenar, decrescente, offset, limit):
+    """
+    Intersecta os conjuntos dos termos (o Redis percorre o menor deles, então o custo
+    acompanha os candidatos e não N) já trazendo o score de ordenação; a faixa de
+    preço filtra esse resultado pequeno.
+    """
+    tmp = f'idx:tmp:{uuid.uuid4().hex}'
+    termos = {f'{TERM_PREFIX}{t}': 0 for t in tokens}
+    minimo = '-inf' if preco_min is None else preco_min
+    maximo = '+inf' if preco_max is None else preco_max
+    filtra_preco = preco_min is not None or preco_max is not None
+
+    pipe = r.pipeline()
+    if ordenar == 'preco':
+        pipe.zinterstore(tmp, {**termos, PRICE_INDEX: 1})
+        pipe.expire(tmp, TMP_TTL_SECONDS)
+        pipe.zcount(tmp, minimo, maximo)
+        if decrescente:
+            pipe.zrevrangebyscore(tmp, maximo, minimo, start=offset, num=limit)
+        else:
+            pipe.zrangebyscore(tmp, minimo, maximo, start=offset, num=limit)
+    else:
+        if filtra_preco:
+            # Candidatos com o preço como score; tira os fora da faixa e troca pelo término
+            pipe.zinterstore(tmp, {**termos, PRICE_INDEX: 1})
+            pipe.zremrangebyscore(tmp, '-inf', f'({minimo}')
+            pipe.zremrangebyscore(tmp, f'({maximo}', '+inf')
+            pipe.zinterstore(tmp, {tmp: 0, END_INDEX: 1})
+        else:
+            pipe.zinterstore(tmp, {**termos, END_INDEX: 1})
+        pipe.expire(tmp, TMP_TTL_SECONDS)
+        pipe.zcard(tmp)
+        pipe.zrange(tmp, offset, offset + limit - 1, desc=decrescente)
+    pipe.delete(tmp)
+    resultados = pipe.execute()
+
+    return resultados[-3], resultados[-2]
+
+def _buscar_faixa_por_termino(r, minimo, maximo, decrescente, offset, limit):
+    """
+    Faixa de preço ordenada por término, sem palavras. Escolhe o caminho mais barato:
+    copiar a faixa e intersectar (faixa estreita) ou percorrer o índice de término
+    em páginas e filtrar pelo preço (faixa larga, acha os K primeiros logo).
+    """
+    pipe = r.pipeline()
+    pipe.zcount(PRICE_INDEX, minimo, maximo)
+    pipe.zcard(END_INDEX)
+    total, tamanho = pipe.execute()
+
+    necessarios = offset + limit
+    if total == 0 or offset >= total:
+        return total, []
+
+    # Custo estimado da varredura: itens lidos até achar `necessarios` dentro da faixa
+    if total <= necessarios * tamanho / total:
+        tmp = f'idx:tmp:{uuid.uuid4().hex}'
+        pipe = r.pipeline()
+        pipe.zrangestore(tmp, PRICE_INDEX, minimo, maximo, byscore=True)
+        pipe.zinterstore(tmp, {tmp: 0, END_INDEX: 1})
+        pipe.expire(tmp, TMP_TTL_SECONDS)
+        pipe.zrange(tmp, offset, offset + limit - 1, desc=decrescente)
+        pipe.delete(tmp)
+        return total, pipe.execute()[-2]
+
+    menor, maior = float(minimo), float(maximo)
+    pagina = max(SCAN_PAGE, 2 * necessarios)
+    encontrados = []
+    inicio = 0
+    while len(encontrados) < necessarios and inicio < tamanho:
+        ids = r.zrange(END_INDEX, inicio, inicio + pagina - 1, desc=decrescente)
+        if not ids:
+            break
+        precos = r.zmscore(PRICE_INDEX, ids)
+        encontrados.extend(i for i, preco in zip(ids, precos) if preco is not None and menor <= preco <= maior)
+        inicio += pagina
+    return total, encontrados[offset:necessarios]
+
+if __name__ == '__main__':
+    r = redis.StrictRedis(host=REDIS_HOST, port=REDIS_PORT, decode_responses=True)
+    print(f"Índice de busca reconstruído: {rebuild(r)} leilões ativos.", flush=True)
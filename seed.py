@@ -4,11 +4,21 @@ import json
 import random
 import os
 import time
+import sys
+import search_index
+import user_index
+import ranking
 
 # --- CONFIGURAÇÃO (AJUSTADO PARA O AMBIENTE K8s) ---
 # Usar 'redis-service' como padrão, que é o nome do serviço no Kubernetes
 REDIS_HOST = os.environ.get('REDIS_HOST', 'redis-service') 
-r = redis.StrictRedis(host=REDIS_HOST, decode_responses=True)
+REDIS_PORT = int(os.environ.get('REDIS_PORT', 6379))
+r = redis.StrictRedis(host=REDIS_HOST, port=REDIS_PORT, decode_responses=True)
+
+def configure_redis(client):
+    """Troca o cliente Redis usado pelo seed (o harness injeta o próprio pool)."""
+    global r
+    r = client
 
 # --- DADOS MOCK ---
 ITENS = [
@@ -77,6 +87,7 @@ def seed_auctions(num_leiloes=20):
         num_lances = random.randint(2, 10) 
         lance_atual = preco_inicial
         usuario_atual = dono
+        licitantes = set()
         
         for _ in range(num_lances):
             participantes_validos = [u for u in USUARIOS if u['id'] != usuario_atual['id']]
@@ -101,6 +112,7 @@ def seed_auctions(num_leiloes=20):
             # Registra o lance no ZSET
             bid_data = json.dumps({'user_id': proximo_lance_user['id'], 'user_name': proximo_lance_user['nome'], 'valor': novo_valor, 'timestamp': datetime.datetime.now().isoformat()})
             r.zadd(f'bids:{auction_id}', {bid_data: novo_valor})
+            licitantes.add(proximo_lance_user['id'])
 
         # Atualiza o leilão com o estado final do último lance
         leilao_data['lance_atual'] = lance_atual
@@ -111,14 +123,30 @@ def seed_auctions(num_leiloes=20):
         r.hset(f'auction:{auction_id}', mapping=leilao_str)
         r.sadd('active_auctions', auction_id)
         
+        # Indexa para a busca e para as visões por usuário
+        pipe = r.pipeline()
+        search_index.index_auction(pipe, auction_id, titulo, lance_atual, leilao_data['horario_termino'])
+        user_index.add_owned(pipe, dono['id'], auction_id)
+        for licitante_id in licitantes:
+            user_index.add_bid(pipe, licitante_id, auction_id)
+        ranking.add_auction(pipe, auction_id)
+        ranking.record_bid(pipe, auction_id, quantidade=num_lances)
+        pipe.execute()
+        
     print(f"Seed concluído. {num_leiloes} leilões ativos criados, todos com lances simulados.", flush=True)
 
+def rebuild_indexes():
+    """
+    Reconstrói (de forma idempotente) os índices de busca, por usuário e de ranking
+    a partir dos leilões já no Redis. Cobre dados criados antes de os índices existirem.
+    """
+    print(f"Índice de busca: {search_index.rebuild(r)} leilões ativos.", flush=True)
+    print(f"Índices por usuário: {user_index.rebuild(r)} leilões.", flush=True)
+    print(f"Ranking: {ranking.rebuild(r)} leilões ativos.", flush=True)
+
 def check_and_seed():
     """Verifica se existem leilões ativos e faz o seed se o Redis estiver vazio."""
-    # Garante que a conexão do Redis dentro da função use a configuração de ambiente
-    r_check = redis.StrictRedis(host=REDIS_HOST, decode_responses=True)
-    
-    if not r_check.exists('next_auction_id'):
+    if not r.exists('next_auction_id'):
         seed_auctions()
         return True
     return False
@@ -127,6 +155,9 @@ if __name__ == '__main__':
     try:
         r.ping()
         print(f"Conectado ao Redis em {REDIS_HOST}.")
-        check_and_seed()
+        if not check_and_seed():
+            # Redis com dados: garante que os índices cobrem tudo o que já existe
+            rebuild_indexes()
     except redis.exceptions.ConnectionError as e:
-        print(f"Erro ao conectar ao Redis: {e}")
\ No newline at end of file
+        print(f"Erro ao conectar ao Redis: {e}")
+        sys.exit(1)  # Falha visível para o Job do k8s tentar de novo
\ No newline at end of file
@@ -0,0 +1,70 @@
+import redis
+import json
+import time
+import os
+
+# --- CONFIGURAÇÃO ---
+
+# Tenta ler do ambiente K8s, fallback para redis-service
+REDIS_HOST = os.environ.get('REDIS_HOST', 'redis-service')
+REDIS_PORT = int(os.environ.get('REDIS_PORT', 6379))
+
+# Sorted Sets por usuário (member = ID do leilão, score = epoch do último evento)
+OWNED = 'leiloes'     # leilões criados pelo usuário
+BIDS = 'lances'       # leilões em que o usuário deu lance
+WINS = 'vitorias'     # leilões que o usuário venceu
+
+def _key(user_id, tipo):
+    return f'user:{user_id}:{tipo}'
+
+# --- MANUTENÇÃO DO ÍNDICE (recebem um pipeline para entrar na mesma ida ao Redis) ---
+
+# nx=True só adiciona o que falta, sem mexer na ordem já registrada (usado pelo rebuild)
+
+def add_owned(pipe, user_id, auction_id, ts=None, nx=False):
+    pipe.zadd(_key(user_id, OWNED), {auction_id: ts or time.time()}, nx=nx)
+
+def add_bid(pipe, user_id, auction_id, ts=None, nx=False):
+    pipe.zadd(_key(user_id, BIDS), {auction_id: ts or time.time()}, nx=nx)
+
+def add_win(pipe, user_id, auction_id, ts=None, nx=False):
+    pipe.zadd(_key(user_id, WINS), {auction_id: ts or time.time()}, nx=nx)
+
+# --- CONSULTA ---
+
+def page(r, user_id, tipo, offset=0, limit=20):
+    """Uma página do índice do usuário, mais recentes primeiro. Retorna (total, [ids])."""
+    pipe = r.pipeline(transaction=False)
+    pipe.zcard(_key(user_id, tipo))
+    pipe.zrevrange(_key(user_id, tipo), offset, offset + limit - 1)
+    total, ids = pipe.execute()
+    return total, ids
+
+def rebuild(r):
+    """
+    Reconstrói os índices a partir dos leilões e fechamentos que ainda estão no Redis.
+    Idempotente: só adiciona o que falta, então pode rodar a cada deploy.
+    """
+    total = 0
+    pipe = r.pipeline(transaction=False)
+    for key in r.scan_iter(match='auction:*', count=500):
+        auction_id = key.split(':', 1)[1]
+        proprietario_id = r.hget(key, 'proprietario_id')
+        if proprietario_id:
+            add_owned(pipe, proprietario_id, auction_id, nx=True)
+        for bid in r.zrange(f'bids:{auction_id}', 0, -1):
+            add_bid(pipe, json.loads(bid)['user_id'], auction_id, nx=True)
+
+        closed = r.hmget(f'closed:{auction_id}', 'status', 'vencedor_id')
+        if closed[0] == 'ENCERRADO' and closed[1] not in (None, '', 'N/A'):
+            add_win(pipe, closed[1], auction_id, nx=True)
+
+        total += 1
+        if total % 500 == 0:
+            pipe.execute()
+    pipe.execute()
+    return total
+
+if __name__ == '__main__':
+    r = redis.StrictRedis(host=REDIS_HOST, port=REDIS_PORT, decode_responses=True)
+    print(f"Índices por usuário reconstruídos: {rebuild(r)} leilões.", flush=True)